@@ -0,0 +1,98 @@
+import concurrent.futures
+import csv
+import hashlib
+import itertools
+import json
+import os
+import statistics
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.analysis import (
+    COLUMNS,
+    OUT_DIR,
+    ROOT_DIR,
+    analyze_file,
+    list_files,
+)
+
+
+CACHE_FILE = os.path.join(OUT_DIR, "cache.json")
+SUMMARY_FILE = os.path.join(OUT_DIR, "summary.csv")
+
+
+def file_hash(filename):
+    """ファイルの内容のハッシュを計算する."""
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_cache():
+    try:
+        with open(CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    cache = load_cache()
+    files = list_files()
+
+    # 内容が変わっていないファイルはキャッシュを使う
+    results = {}
+    todo = []
+    for filename, kind in files:
+        key = os.path.relpath(filename, ROOT_DIR)
+        digest = file_hash(filename)
+        entry = cache.get(key)
+        if entry is not None and entry["hash"] == digest and "rows" in entry:
+            results[key] = entry["rows"]
+        else:
+            todo.append((key, filename, kind, digest))
+
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        futures = {
+            executor.submit(analyze_file, filename, kind): (key, digest)
+            for key, filename, kind, digest in todo}
+        for future in concurrent.futures.as_completed(futures):
+            key, digest = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"ERROR: Could not analyze '{key}': {e}",
+                      file=sys.stderr)
+                continue
+            results[key] = rows
+            cache[key] = {"hash": digest, "rows": rows}
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+    with open(CACHE_FILE, "w") as f:
+        json.dump(cache, f)
+
+    # 集計表の保存
+    rows = [
+        [key] + [features.get(c, "") for c in COLUMNS[1:]]
+        for key in sorted(results) for features in results[key]]
+    with open(SUMMARY_FILE, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerows([COLUMNS] + rows)
+
+    # モードごとの平均
+    modes = {}
+    for features in itertools.chain.from_iterable(results.values()):
+        modes.setdefault(
+            (features["kind"], features["mode"]), []).append(
+                features["env_mean"])
+    for (kind, mode), values in sorted(modes.items()):
+        print(f"{kind:12s} {mode:16s} n={len(values):3d} "
+              f"mean={statistics.mean(values):.4f} mV", file=sys.stderr)
+    print(f"Analyzed {len(todo)} file(s), {len(files) - len(todo)} cached. "
+          f"Summary: {SUMMARY_FILE}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.recording import convert_csv
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python convert.py <csv_file> ...")
+        sys.exit(1)
+
+    for filename in sys.argv[1:]:
+        convert_csv(filename)
+
+
+if __name__ == "__main__":
+    main()
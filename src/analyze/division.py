@@ -1,51 +1,87 @@
+import os
 import sys
-import csv
 
-import matplotlib.pyplot as plt
+import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.analysis import OUT_DIR
+from modules.device import BITS, GAIN, VCC, calc_emg
+from modules.features import feature_names, sliding_windows, window_features
+from modules.figures import LinePlot, fig_dir, render_parallel
+from modules.recording import read_signal
 
-def read_csv(filename):
-    with open(filename, newline='') as f:
-        reader = csv.reader(f)
-        label = next(reader)[0]  # 1行目のラベル
-        data = [float(row[0]) for row in reader]  # 2行目以降のデータ
-    return label, data
 
+WINDOWS_PER_JOB = 50
 
-def plot_data(data, label, N, t, n):
-    start = n*t
-    end = n*t + N
-    sampled_data = data[start:end]
-    indices = list(range(len(data)))
-    sampled_indices = indices[start:end]
 
-    fig = plt.figure()
-    ax = fig.add_subplot(111)
-    ax.plot(indices, data)
-    ax.plot(sampled_indices, sampled_data)
-    ax.set_xlabel("Time (sampled every {} steps)".format(t))
-    ax.set_ylabel(label)
-    ax.set_ylim(0, 1024)
-    ax.set_title(f"Visualization of {label} (N={N}, t={t})")
-    plt.show()
+def plot_windows(file, N, t, windows, out_dir):
+    """窓ごとの図を保存する. 図は 1 つだけ作り, 窓の線だけを差し替える."""
+    label, data = read_signal(file)
+    plot = LinePlot(
+        2, xlabel="Time (sampled every {} steps)".format(t), ylabel=label,
+        ylim=(0, 1024))
+    plot.set_data(0, data)
+    for n in windows:
+        start = n*t
+        end = n*t + N
+        plot.set_data(1, data[start:end], np.arange(start, end))
+        plot.set_title(f"Visualization of {label} (N={N}, t={t}, n={n})")
+        plot.save(os.path.join(out_dir, f"{n:05d}.png"))
+    return len(windows)
+
+
+def extract_features(data, N, t):
+    """長さ N, 間隔 t の窓ごとの特徴量を計算し, (窓の開始位置, 特徴量) を返す."""
+    windows = sliding_windows(calc_emg(data, BITS, VCC, GAIN), N, t)
+    starts = np.arange(len(windows)) * t
+    return starts, window_features(windows)
+
+
+def save_features(filename, starts, features):
+    """特徴量の行列を CSV に保存する."""
+    header = ",".join(["start"] + feature_names())
+    np.savetxt(
+        filename, np.column_stack([starts, features]), delimiter=",",
+        header=header, comments="", fmt=["%d"] + ["%.6g"] * features.shape[1])
 
 
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: python script.py <csv_file> <N> <t>")
+    args = [arg for arg in sys.argv[1:] if arg != "--plot"]
+    if len(args) != 3:
+        print("Usage: python script.py <csv_file> <N> <t> [--plot]")
         sys.exit(1)
     
-    file = sys.argv[1]
+    file = args[0]
     try:
-        N = int(sys.argv[2])
-        t = int(sys.argv[3])
+        N = int(args[1])
+        t = int(args[2])
     except ValueError:
         print("Error: N and t must be integers.")
         sys.exit(1)
     
-    label, data = read_csv(file)
-    for i in range((len(data) - N) // t):
-        plot_data(data, label, N, t, i)
+    _, data = read_signal(file)
+    stem = os.path.splitext(os.path.basename(file))[0]
+
+    # 窓ごとの特徴量
+    starts, features = extract_features(data, N, t)
+    os.makedirs(OUT_DIR, exist_ok=True)
+    filename = os.path.join(OUT_DIR, f"features_{stem}_N{N}_t{t}.csv")
+    save_features(filename, starts, features)
+    print(f"Saved {features.shape[0]}x{features.shape[1]} features to "
+          f"{filename}")
+
+    if "--plot" not in sys.argv[1:]:
+        return
+
+    n_windows = len(starts)
+    out_dir = os.path.join(fig_dir(), f"division_{stem}_N{N}_t{t}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    jobs = [
+        (file, N, t, range(i, min(i + WINDOWS_PER_JOB, n_windows)), out_dir)
+        for i in range(0, n_windows, WINDOWS_PER_JOB)]
+    n_saved = sum(n for n in render_parallel(plot_windows, jobs) if n)
+    print(f"Saved {n_saved} figure(s) to {out_dir}")
 
 
 if __name__ == "__main__":
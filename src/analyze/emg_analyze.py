@@ -1,57 +1,46 @@
-import csv
+import os
 import pathlib
 import sys
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.device import BITS, GAIN, VCC, calc_emg
+from modules.figures import LinePlot, fig_dir, render_parallel
+from modules.filters import ema
+from modules.recording import read_signal
 
-BITS = 10
-VCC = 3.3
-GAIN = 1009
 
+def plot_emg(filename, out_dir):
+    """EMG と EMA のグラフを保存する."""
+    label, data = read_signal(pathlib.Path(filename).resolve())
 
-def read_csv(filename):
-    with open(filename, newline='') as f:
-        reader = csv.reader(f)
-        label = next(reader)[0]  # 1行目のラベル
-        data = [float(row[0]) for row in reader]  # 2行目以降のデータ
-    return label, data
-
-
-def calc_emg(data):
-    emg = ((np.array(data) / 2**BITS) - 1/2) * VCC * 1000 / GAIN
-    return emg
+    emg = calc_emg(data, BITS, VCC, GAIN)
+    emg = np.abs(emg)
 
+    # EMS を計算
+    ema1, ema2, ema3 = ema(emg, [0.80, 0.90, 0.95])
 
-def calc_ema(arr, rho):
-    ems = [arr[0]]
-    for val in arr[1:]:
-        ems.append(rho*ems[-1] + (1 - rho)*val)
-    return np.array(ems)
+    # グラフを保存
+    plot = LinePlot(
+        4, labels=["EMG", "EMA (ρ = 0.80)", "EMA (ρ = 0.90)",
+                   "EMA (ρ = 0.95)"],
+        alphas=[0.25] * 4, xlabel="Index", ylabel="Output", ylim=(0.0, 1.0))
+    for i, y in enumerate([emg, ema1, ema2, ema3]):
+        plot.set_data(i, y)
+    out_filename = os.path.join(
+        out_dir, f"ema_{pathlib.Path(filename).stem}.png")
+    plot.save(out_filename)
+    return out_filename
 
 
 if __name__ == "__main__":
-    filename = sys.argv[1]
-    label, data = read_csv(pathlib.Path(filename).resolve())
-
-    emg = calc_emg(data)
-    emg = np.abs(emg)
-
-    # EMS を計算
-    ema1 = calc_ema(emg, 0.80)
-    ema2 = calc_ema(emg, 0.90)
-    ema3 = calc_ema(emg, 0.95)
-
-    # グラフを表示
-    fig = plt.figure()
-    ax = fig.add_subplot(111)
-    ax.plot(emg, alpha=0.25, label="EMG")
-    ax.plot(ema1, alpha=0.25, label="EMA (ρ = 0.80)")
-    ax.plot(ema2, alpha=0.25, label="EMA (ρ = 0.90)")
-    ax.plot(ema3, alpha=0.25, label="EMA (ρ = 0.95)")
-    ax.legend()
-    ax.set_xlabel("Index")
-    ax.set_ylabel("Output")
-    ax.set_ylim(0.0, 1.0)
-    plt.show()
+    if len(sys.argv) < 2:
+        print("Usage: python script.py <csv_file> ...")
+        sys.exit(1)
+
+    out_dir = fig_dir()
+    for out_filename in render_parallel(
+            plot_emg, [(filename, out_dir) for filename in sys.argv[1:]]):
+        if out_filename is not None:
+            print(f"Saved {out_filename}")
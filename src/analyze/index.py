@@ -0,0 +1,167 @@
+import concurrent.futures
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.analysis import OUT_DIR, ROOT_DIR, analyze_file, list_files
+from modules.recording import parse_filename
+
+
+INDEX_FILE = os.path.join(OUT_DIR, "index.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    start_time TEXT,
+    date TEXT
+);
+CREATE TABLE IF NOT EXISTS stats (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    std REAL NOT NULL,
+    p95 REAL,
+    mean_abs REAL,
+    above_thd REAL,
+    crossings INTEGER,
+    PRIMARY KEY (path, phase)
+);
+CREATE INDEX IF NOT EXISTS stats_phase ON stats(phase);
+CREATE INDEX IF NOT EXISTS files_date ON files(date);
+"""
+
+
+def connect(filename=INDEX_FILE):
+    """索引のデータベースを開く (なければ作成する)."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    db = sqlite3.connect(filename)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(SCHEMA)
+    return db
+
+
+def update_index(db):
+    """更新時刻とサイズが変わったファイルだけを解析し, 索引を更新する.
+
+    削除されたファイルは索引からも除く. 解析したファイルの数を返す.
+    """
+    known = {
+        row["path"]: (row["mtime"], row["size"])
+        for row in db.execute("SELECT path, mtime, size FROM files")}
+    todo = []
+    paths = set()
+    for filename, kind in list_files():
+        path = os.path.relpath(filename, ROOT_DIR)
+        st = os.stat(filename)
+        paths.add(path)
+        if known.get(path) != (st.st_mtime, st.st_size):
+            todo.append((path, filename, kind, st))
+
+    with db:
+        db.executemany(
+            "DELETE FROM files WHERE path = ?",
+            [(path,) for path in known.keys() - paths])
+
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        futures = {
+            executor.submit(analyze_file, filename, kind): (
+                path, filename, kind, st)
+            for path, filename, kind, st in todo}
+        for future in concurrent.futures.as_completed(futures):
+            path, filename, kind, st = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"ERROR: Could not analyze '{path}': {e}",
+                      file=sys.stderr)
+                continue
+            start_time, _ = parse_filename(filename)
+            with db:
+                db.execute("DELETE FROM files WHERE path = ?", (path,))
+                db.execute(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, kind, st.st_mtime, st.st_size,
+                     start_time and start_time.isoformat(),
+                     start_time and start_time.date().isoformat()))
+                db.executemany(
+                    "INSERT INTO stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(path, f["mode"], f["samples"], f["env_mean"],
+                      f["env_std"], f["env_p95"], f["mean_abs"],
+                      f["above_thd"], f["crossings"]) for f in rows])
+    return len(todo)
+
+
+def make_where(kind=None, phase=None, date=None):
+    """条件の WHERE 句とパラメータを作る."""
+    conditions = []
+    params = []
+    for column, value in [
+            ("files.kind", kind), ("stats.phase", phase),
+            ("files.date", date)]:
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+
+def query(db, kind=None, phase=None, date=None):
+    """条件に合うファイルとフェーズごとの統計量を返す."""
+    where, params = make_where(kind, phase, date)
+    return db.execute(
+        "SELECT files.path, files.kind, files.date, stats.* FROM stats"
+        " JOIN files USING (path)" + where + " ORDER BY files.path",
+        params).fetchall()
+
+
+def summarize(db, kind=None, phase=None, date=None):
+    """条件に合う全サンプルをまとめた img の平均と標準偏差を返す.
+
+    ファイルごとのサンプル数・平均・標準偏差から計算するので, ファイル
+    は開かない.
+    """
+    where, params = make_where(kind, phase, date)
+    row = db.execute(
+        "SELECT COUNT(*) AS files, SUM(samples) AS samples,"
+        " SUM(samples * mean) AS s1,"
+        " SUM(samples * (std * std + mean * mean)) AS s2"
+        " FROM stats JOIN files USING (path)" + where, params).fetchone()
+    if not row["samples"]:
+        return {"files": 0, "samples": 0, "mean": None, "std": None}
+    mean = row["s1"] / row["samples"]
+    var = max(row["s2"] / row["samples"] - mean**2, 0.0)
+    return {
+        "files": row["files"], "samples": row["samples"],
+        "mean": mean, "std": var**0.5}
+
+
+def main():
+    if len(sys.argv) > 3:
+        print("Usage: python script.py [<phase> [<date>]]")
+        sys.exit(1)
+    phase = sys.argv[1] if len(sys.argv) > 1 else None
+    date = sys.argv[2] if len(sys.argv) > 2 else None
+
+    db = connect()
+    n = update_index(db)
+    print(f"Indexed {n} new or modified file(s).", file=sys.stderr)
+
+    for row in query(db, phase=phase, date=date):
+        print(f"{row['path']},{row['phase']},{row['samples']},"
+              f"{row['mean']:.4f},{row['std']:.4f}")
+    summary = summarize(db, phase=phase, date=date)
+    if summary["files"] > 0:
+        print(f"TOTAL: {summary['files']} file(s), {summary['samples']} "
+              f"samples, mean {summary['mean']:.4f} mV, "
+              f"std {summary['std']:.4f} mV")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,12 @@ import os
 import sys
 import time
 
-import bitalino
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.device import get_device
+from modules.recording import RECORDING_EXT, RecordingWriter, make_header
+from modules.writer import BackgroundWriter
 
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
@@ -16,38 +21,90 @@ N_SAMPLES = 100
 
 MEASUREMENT_TIME = 10.0  # s
 
+# True の場合, 記録ファイルへ逐次書き込む (複数ピン・時間制限なし)
+STREAM_RECORDING = True
+
+LATE_RATE = 1.5  # ブロックの間隔が本来の何倍を超えたら遅れとみなすか
+
 
-def get_device(mac_address):
-    device = None
+def record_stream(device, filename, header, duration):
+    """ブロックを読み続け, 書き込み用スレッドを通して記録ファイルに書き込む.
+
+    duration (s) が経過するか Ctrl-C で終了する. duration が 0 以下の
+    場合は Ctrl-C まで続ける.
+    """
+    n_channels = len(header["channels"])
+    recording = RecordingWriter(filename, header)
+    writer = BackgroundWriter(
+        lambda blocks: recording.append(np.concatenate(blocks)),
+        recording.flush)
+    writer.start()
+
+    block_time = N_SAMPLES / SAMPLING_RATE
+    n_blocks = 0
+    n_late = 0
+    start_time = last_time = time.monotonic()
     try:
-        device = bitalino.BITalino(mac_address)
-    except Exception as e:
-        print("ERROR: The MAC address or serial port for the device is "
-              "invalid.", file=sys.stderr)
-    return device
+        while duration <= 0 or time.monotonic() - start_time < duration:
+            data = device.read(N_SAMPLES)
+            current_time = time.monotonic()
+            if current_time - last_time > block_time * LATE_RATE:
+                n_late += 1
+            last_time = current_time
+            writer.put(data[:, 5:5 + n_channels])
+            n_blocks += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            writer.stop()
+        finally:
+            recording.close()
+
+    print(f"READER: blocks {n_blocks}, late {n_late}", file=sys.stderr)
+    writer.report()
 
 
 if __name__ == "__main__":
-    # デバイスの取得
-    device = get_device(MAC_ADDRESS)
-    if type(device) !=  bitalino.BITalino:
+    # デバイスの取得 (引数で "replay:..." を指定すると記録データを再生する)
+    mac_address = sys.argv[1] if len(sys.argv) > 1 else MAC_ADDRESS
+    device = get_device(mac_address)
+    if device is None:
         print("ERROR: Could not get the device.", file=sys.stderr)
         exit(1)
     print("Succeeded in getting the device!")
     time.sleep(1.0)
 
     # 計測準備
-    pin = int(input("Input the number of a pin > "))
-    device.start(SAMPLING_RATE, [pin])
+    if STREAM_RECORDING:
+        # 実機と同じく, 重複を除いた昇順のピンが記録の列の並びになる
+        pins = sorted(set(
+            int(i) for i in input("Input the numbers of pins > ").split()))
+    else:
+        pins = [int(input("Input the number of a pin > "))]
+    device.start(SAMPLING_RATE, pins)
 
     # データ計測
     label = input("Input the label > ")
     mode = input("Input the name of the mode > ")
+    if STREAM_RECORDING:
+        duration = float(input(
+            "Input the measurement time in seconds (0: until Ctrl-C) > "))
 
     print("Ready to start measurement...")
     time.sleep(3.0)
     print("Go!")
 
+    if STREAM_RECORDING:
+        # 記録ファイルに逐次保存
+        dt_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        filename = os.path.join(
+            DATA_DIR, f"{dt_str}_v1_{mode}{RECORDING_EXT}")
+        header = make_header(
+            label, [f"A{pin}" for pin in pins], pins, SAMPLING_RATE)
+        record_stream(device, filename, header, duration)
+        sys.exit(0)
+
     start_time = time.time()
     result = [[label]]
     while True:
@@ -1,16 +1,10 @@
-import csv
+import os
 import pathlib
 import sys
 
-import matplotlib.pyplot as plt
-
-
-def read_csv(filename):
-    with open(filename, newline='') as f:
-        reader = csv.reader(f)
-        label = next(reader)[0]  # 1行目のラベル
-        data = [float(row[0]) for row in reader]  # 2行目以降のデータ
-    return label, data
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.figures import LinePlot, fig_dir
+from modules.recording import read_signal
 
 
 def main():
@@ -19,20 +13,24 @@ def main():
         sys.exit(1)
 
     file1, file2 = sys.argv[1], sys.argv[2]
-    label1, data1 = read_csv(pathlib.Path(file1).resolve())
-    label2, data2 = read_csv(pathlib.Path(file2).resolve())
+    label1, data1 = read_signal(pathlib.Path(file1).resolve())
+    label2, data2 = read_signal(pathlib.Path(file2).resolve())
 
     if label1 != label2:
         print("Error: CSV files must have the same label in the first row.")
         sys.exit(1)
 
-    plt.plot(data1, label=f"{file1}", alpha=0.5)
-    plt.plot(data2, label=f"{file2}", alpha=0.5)
-    plt.xlabel("Time")
-    plt.ylabel(label1)
-    plt.legend()
-    plt.title(f"Visualization of {label1}")
-    plt.show()
+    plot = LinePlot(
+        2, labels=[f"{file1}", f"{file2}"], alphas=[0.5, 0.5],
+        xlabel="Time", ylabel=label1, title=f"Visualization of {label1}")
+    plot.set_data(0, data1)
+    plot.set_data(1, data2)
+
+    stem1 = pathlib.Path(file1).stem
+    stem2 = pathlib.Path(file2).stem
+    filename = os.path.join(fig_dir(), f"{label1}_{stem1}_{stem2}.png")
+    plot.save(filename)
+    print(f"Saved {filename}")
 
 
 if __name__ == "__main__":
@@ -1,16 +1,10 @@
-import csv
+import os
 import pathlib
 import sys
 
-import matplotlib.pyplot as plt
-
-
-def read_csv(filename):
-    with open(filename, newline='') as f:
-        reader = csv.reader(f)
-        label = next(reader)[0]  # 1行目のラベル
-        data = [float(row[0]) for row in reader]  # 2行目以降のデータ
-    return label, data
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.figures import LinePlot, fig_dir
+from modules.recording import read_signal
 
 
 def main():
@@ -20,14 +14,17 @@ def main():
 
     files = sys.argv[1:]
     n = len(sys.argv) - 1
+    plot = LinePlot(
+        n, labels=[f"{file}" for file in files], alphas=[1/n] * n,
+        xlabel="Time", ylabel="Output")
     for i in range(n):
-        label, arr = read_csv(pathlib.Path(files[i]).resolve())
-        plt.plot(arr, label=f"{files[i]}", alpha=1/n)
+        label, arr = read_signal(pathlib.Path(files[i]).resolve())
+        plot.set_data(i, arr)
 
-    plt.xlabel("Time")
-    plt.ylabel("Output")
-    plt.legend()
-    plt.show()
+    filename = os.path.join(
+        fig_dir(), f"compare_{pathlib.Path(files[0]).stem}_{n}.png")
+    plot.save(filename)
+    print(f"Saved {filename}")
 
 
 if __name__ == "__main__":
@@ -1,10 +1,18 @@
 import sys
+import threading
 import time
 
-import bitalino
 import matplotlib.pyplot as plt
+from matplotlib.patches import Polygon
+import numpy as np
 
-from modules.device import get_device, calc_emg
+from modules.buffer import RingBuffer
+from modules.device import (
+    MAX_BLOCK_DATA_LEN,
+    get_device,
+    sample_block,
+)
+from modules.figures import decimate_minmax, envelope_minmax
 
 
 MAC_ADDRESS = "98:D3:91:FE:44:E9"
@@ -13,54 +21,131 @@ EMG_PIN = 1
 ACC_PIN = 0
 
 SAMPLING_RATE = 1000  # Hz
-N_SAMPLES = 100
 
-BITS = 10
-VCC = 3.3
-GAIN = 1009
+# 表示の設定
+PLOT_SECONDS = 5.0  # s
+PLOT_LEN = int(PLOT_SECONDS * SAMPLING_RATE)
+PLOT_BINS = 600  # 横方向の区間の数 (区間ごとに最小値と最大値を描く)
+
+FPS = 30
+
+
+# マルチスレッド用
+stop_event = threading.Event()
+
+
+def sample_t_func(device, accs, emgs, emgs_ema):
+    """サンプリング用スレッドの関数."""
+    features = {}
+    while not stop_event.is_set():
+        sample_block(device, accs, emgs, emgs_ema, features)
+
+
+def times(n):
+    """直近 n サンプルの時刻 (s, 最新が 0)."""
+    return (np.arange(n) - n) / SAMPLING_RATE
+
+
+class Scope:
+    """ACC と EMG の直近 PLOT_SECONDS 秒を表示するオシロスコープ.
+
+    ACC と EMG は区間ごとの最小値から最大値までを塗りつぶした帯
+    (Polygon), EMA は線 (Line2D) で描く. これらは使い回し, 軸などの背景を
+    保存しておいてデータだけを blit で描き直す. ウィンドウの大きさが
+    変わるなどして全体が再描画されたら, 背景を取り直す.
+    """
+
+    def __init__(self):
+        self.fig, (ax_acc, ax_emg) = plt.subplots(2, 1, sharex=True)
+        self.canvas = self.fig.canvas
+
+        ax_acc.set_ylabel("ACC")
+        ax_acc.set_ylim(0, 1024)
+        ax_emg.set_xlabel("Time (s)")
+        ax_emg.set_ylabel("EMG (mV)")
+        ax_emg.set_ylim(-1.0, 1.0)
+        ax_emg.set_xlim(-PLOT_SECONDS, 0.0)
+
+        self.bands = [
+            Polygon(np.zeros((0, 2)), animated=True, color="C0"),
+            Polygon(np.zeros((0, 2)), animated=True, color="C0",
+                    label="EMG"),
+        ]
+        ax_acc.add_patch(self.bands[0])
+        ax_emg.add_patch(self.bands[1])
+        self.line = ax_emg.plot(
+            [], [], animated=True, color="C1", label="EMA")[0]
+        self.artists = self.bands + [self.line]
+        ax_emg.legend(loc="upper left")
+
+        self.background = None
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.mpl_connect("close_event", lambda event: stop_event.set())
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+
+    def update(self, accs, emgs, emgs_ema):
+        """バッファの直近のデータで帯と線を差し替え, それだけを描き直す."""
+        for band, buffer in zip(self.bands, [accs, emgs]):
+            y = buffer.snapshot(PLOT_LEN)
+            x, lo, hi = envelope_minmax(y, PLOT_BINS, times(len(y)))
+            band.set_xy(np.column_stack([
+                np.concatenate([x, x[::-1]]),
+                np.concatenate([lo, hi[::-1]])]))
+        y = emgs_ema.snapshot(PLOT_LEN)
+        self.line.set_data(*decimate_minmax(y, PLOT_BINS, times(len(y))))
+        if self.background is None:
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_lines()
+        self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
 
 
 if __name__ == "__main__":
-    # デバイスの取得
-    device = get_device(MAC_ADDRESS)
-    if type(device) !=  bitalino.BITalino:
+    # デバイスの取得 (引数で "replay:..." を指定すると記録データを再生する)
+    mac_address = sys.argv[1] if len(sys.argv) > 1 else MAC_ADDRESS
+    device = get_device(mac_address)
+    if device is None:
         print("ERROR: Could not get the device.", file=sys.stderr)
         exit(1)
 
     # 計測準備
     device.start(SAMPLING_RATE, [ACC_PIN, EMG_PIN])
 
-    # データ計測
-    start_time = 0.0
-    update_time = 0.5
-
-    fig = plt.figure()
-    ax = fig.add_subplot(111)
-
-    emgs = []
-    emgs_ema = []
-    rho = 0.90
-    while True:
-        data = device.read(N_SAMPLES)
-        emg = calc_emg(data[:, 5 + EMG_PIN][0], BITS, VCC, GAIN)
-        #emg = abs(emg)
-        emgs.append(emg)
-        emgs_ema.append(
-            rho*emgs_ema[-1] + (1 - rho)*emg
-                if len(emgs_ema) > 0
-                else emg)
-        if len(emgs) > 100:
-            emgs = emgs[-100:]
-            emgs_ema = emgs_ema[-100:]
-
-        current_time = time.time()
-        if current_time - start_time > update_time:
-            start_time = current_time
-            ax.cla()
-            ax.plot(emgs)
-            ax.plot(emgs_ema)
-            ax.set_xlabel("Index")
-            ax.set_ylabel("EMG / ms")
-            ax.set_ylim(-1.0, 1.0)
-            plt.draw()
-            plt.pause(0.1)
+    accs = RingBuffer(MAX_BLOCK_DATA_LEN)
+    emgs = RingBuffer(MAX_BLOCK_DATA_LEN)
+    emgs_ema = RingBuffer(MAX_BLOCK_DATA_LEN)
+    sample_t = threading.Thread(
+        target=sample_t_func, args=[device, accs, emgs, emgs_ema])
+    sample_t.start()
+
+    # 表示
+    scope = Scope()
+    plt.show(block=False)
+    scope.canvas.draw()
+
+    frames = 0
+    start_time = time.perf_counter()
+    next_time = start_time
+    try:
+        while not stop_event.is_set():
+            scope.update(accs, emgs, emgs_ema)
+            frames += 1
+            next_time = max(next_time + 1 / FPS, time.perf_counter() - 1 / FPS)
+            time.sleep(max(next_time - time.perf_counter(), 0.0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        sample_t.join()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"FRAME: {frames} frames in {elapsed:.1f} s, "
+          f"fps {frames / elapsed:.2f}", file=sys.stderr)
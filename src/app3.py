@@ -1,40 +1,74 @@
+import asyncio
 import os
 import sys
-import threading
 import time
 
-import bitalino
 import numpy as np
 import pygame
 import pygame.locals
 
+from modules.buffer import RingBuffer
+from modules.clock import FrameClock
+from modules.pipeline import PIPE_CAPACITY, PIPE_FIELDS, SamplePipe
+from modules.runtime import (
+    pump_events,
+    repeat_in_executor,
+    run_until_first,
+    wait_until,
+)
+from modules.sampler import SamplerProcess
+from modules.session import SESSION_EXT, SessionLog
+from modules.spectral import SpectralDetector
+from modules.trace import (
+    STAGE_READ,
+    STAGE_RECEIVED,
+    STAGE_SAMPLED,
+    STAGE_DETECTED,
+    STAGE_ACTIVATED,
+    STAGE_DISPLAYED,
+    Tracer,
+    NullTracer,
+)
 from modules.device import (
+    MAX_DATA_LEN,
+    MAX_BLOCK_DATA_LEN,
     get_device,
     start_device,
     sample_data,
+    sample_block,
 )
 from modules.facial import (
+    LOG_DIR,
+    SPARK_LEN,
+    Gauge,
+    Recalibrator,
     calibrate,
+    criteria,
     detect_smile,
-    make_gauge_surface,
+    detect_smile_spectral,
+    make_filename,
 )
 from modules.honeycomb import (
     FIELDS,
+    HoneycombLayer,
     load_hc_imgs,
     make_field_info,
     activate_honeycomb,
     deactivate_honeycomb,
-    make_hc_surface,
 )
 
 
 # ファイルパス
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), "..", "assets")
 IMG_DIR = os.path.join(ASSETS_DIR, "img")
+LATENCY_LOG_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "log", "latency")
 
 # デバイス関連
 MAC_ADDRESS = "98:D3:91:FE:44:E9"
 
+GET_DEVICE_INTERVAL = 1.0  # s
+
 # 画面の設定
 SCREEN_W = 720
 SCREEN_H = 600
@@ -44,40 +78,91 @@ SCREEN_CENTER = np.array([SCREEN_W, SCREEN_H]) / 2
 
 BG_COLOR = (200, 200, 200)
 
+FPS = 30
+LOGIC_RATE = 20  # Hz
+VSYNC = False
+
+# ステージ
+STAGE_INTRO_TIME = 3.0  # s
+STAGE_CLEAR_TIME = 5.0  # s
+
 # その他
 SMILE_THRES = 0.08  # mV
 
-MAX_HC = 126
+# True の場合, ブロックの全サンプルを使ってサンプリングする
+BLOCK_SAMPLING = True
 
+MAX_SAMPLE_AGE = 0.5  # s (これより古いデータでは判定しない)
 
-# マルチスレッド用
-stop_event = threading.Event()
+# True の場合, EMA の閾値ではなく EMG の帯域パワーで笑顔を判定する
+# (ブロック単位のサンプリングのみ)
+SPECTRAL_DETECTION = False
 
+# True の場合, プレイ中も閾値を電極の状態の変化に追従させる
+BACKGROUND_RECALIBRATION = True
 
-def sample_t_func(device, accs, emgs, emgs_ema):
-    """サンプリング用スレッドの関数."""
-    while not stop_event.is_set():
-        sample_data(device, accs, emgs, emgs_ema)
+# True の場合, キャリブレーションとプレイ中のブロックを log/calibration に
+# 記録する (1 セッション 1 ファイル)
+SESSION_LOG = True
+
+# True の場合, サンプリングを別プロセスで行い, 共有メモリで受け渡す
+# (描画と GIL を取り合わない. 遅延の計測では read の段階を除く)
+PROCESS_SAMPLING = False
 
+# True の場合, センサから画面までの遅延を計測して log/latency に保存する
+TRACE_LATENCY = False
 
-def render_t_func(surfaces, field_info, emgs_ema):
-    """描画用スレッドの関数."""
-    while not stop_event.is_set():
-        hc_surface = make_hc_surface(SCREEN_SIZE, field_info)
-        gauge_surface = make_gauge_surface(SCREEN_SIZE, emgs_ema[-1])
-        surfaces["hc"] = hc_surface
-        surfaces["gauge"] = gauge_surface
 
+def sample_once(device, accs, emgs, emgs_ema, features, pipe, tracer,
+                detector):
+    """1 ブロック分をサンプリングし, パイプに書き込む.
 
-def main_t_func(device, screen, accs, emgs, emgs_ema):
+    デバイスの読み出しで待つので, executor (専用のスレッド) で呼ぶ.
+    """
+    seq = pipe.count
+    tracer.mark(seq, STAGE_READ)
+    if BLOCK_SAMPLING:
+        sample_block(device, accs, emgs, emgs_ema, features, detector)
+    else:
+        sample_data(device, accs, emgs, emgs_ema)
+        emg = emgs.latest()
+        features.update(
+            time=time.monotonic(), ema=emgs_ema.latest(), last=emg,
+            mean=abs(emg), rms=abs(emg), power=0.0, ratio=0.0)
+    tracer.mark(seq, STAGE_RECEIVED, features["time"])
+    tracer.mark(seq, STAGE_SAMPLED)
+    pipe.publish(features)
+
+
+def update_screen(screen, layers, rects):
+    """レイヤ (surface と画面上の rect を持つ) を重ねて描画し,
+    指定された領域だけ画面を更新する."""
+    for rect in rects:
+        screen.fill(BG_COLOR, rect)
+        for layer in layers:
+            area = rect.clip(layer.rect)
+            if area:
+                screen.blit(
+                    layer.surface, area,
+                    area.move(-layer.rect.x, -layer.rect.y))
+    pygame.display.update(rects)
+
+
+async def mainloop(screen, emgs_ema, pipe, tracer, session):
+    """ゲーム本体 (キャリブレーションと各ステージ) のコルーチン.
+
+    待機やフレームの間はイベントループに制御を返す. QUIT などで
+    キャンセルされた場合は, その時点の await で終わる.
+    """
     # データが取得されるまで待機
-    while len(emgs_ema) == 0:
-        time.sleep(0.1)
+    await wait_until(lambda: pipe.count > 0)
 
     # キャリブレーション
-    calibrate(device, screen, emgs_ema)
+    await calibrate(screen, pipe, session)
+    recalibrator = Recalibrator() if BACKGROUND_RECALIBRATION else None
 
     font = pygame.font.Font(None, 64)
+    clock = FrameClock(FPS, LOGIC_RATE, VSYNC)
 
     field_num = 0
     while field_num < len(FIELDS):
@@ -87,119 +172,192 @@ def main_t_func(device, screen, accs, emgs, emgs_ema):
         # フィールド読み込み
         field_info = make_field_info(FIELDS[field_num], SCREEN_CENTER)
 
-        # 描画用スレッドの準備
-        surfaces = {
-            "hc": make_hc_surface(SCREEN_SIZE, field_info),
-            "gauge": make_gauge_surface(SCREEN_SIZE, emgs_ema[-1]),
-        }
-        #render_t = threading.Thread(
-        #    target=render_t_func, args=[surfaces, field_info, emgs_ema])
-        #render_t.start()
+        # 描画するレイヤの準備
+        hc_layer = HoneycombLayer(SCREEN_SIZE, field_info)
+        gauge = Gauge()
+        layers = [hc_layer, gauge]
 
         screen.fill(color=BG_COLOR)
         screen.blit(font.render(f"STAGE {field_num + 1}", True, (32, 32, 32)), (300, 200))
         pygame.display.update()
-        start_time = time.time()
-        while time.time() - start_time < 3.0:
-            time.sleep(0.05)
+        await clock.wait(STAGE_INTRO_TIME)
 
-        start_time = 0.0
+        # 最初は画面全体を描画する
+        hc_layer.update()
+        gauge.update(pipe.latest("ema")[0], emgs_ema.snapshot(SPARK_LEN))
+        update_screen(screen, layers, [screen.get_rect()])
+
+        game_time = 0.0
         update_time = 0.5
-        while not stop_event.is_set():
+        start_time = -update_time
+        reader = pipe.reader()
+        max_age = 0.0
+        detected_seq = -1
+        activated_seqs = []
+        while True:
             #sample_data(device, accs, emgs, emgs_ema)
 
-            # 描画
-            screen.fill(color=BG_COLOR)
-            hc_surface = make_hc_surface(SCREEN_SIZE, field_info)
-            gauge_surface = make_gauge_surface(SCREEN_SIZE, emgs_ema[-1])
-            surfaces["hc"] = hc_surface
-            surfaces["gauge"] = gauge_surface
-            screen.blit(surfaces["hc"], (0, 0))
-            screen.blit(surfaces["gauge"], (0, 0))
-
-            pygame.display.update()
+            # ゲームロジック (描画とは独立に固定の時間刻みで進める)
+            for _ in range(clock.logic_steps()):
+                game_time += clock.logic_dt
+
+                values, times = reader.read()
+                if PROCESS_SAMPLING:
+                    # サンプリング用プロセスは段階を記録できないので,
+                    # ブロックの時刻と受け取った時刻をここで記録する
+                    tracer.mark_arrived(
+                        range(reader.next - len(values), reader.next), times)
+                if session is not None:
+                    session.log(
+                        f"stage{field_num + 1}", times,
+                        values[:, [PIPE_FIELDS.index("ema"),
+                                   PIPE_FIELDS.index("mean")]])
+
+                # 古いデータしかない場合は判定しない
+                ema, age = pipe.latest("ema")
+                max_age = max(max_age, age)
+                if age > MAX_SAMPLE_AGE:
+                    continue
+
+                # 笑顔の判定 (新しいブロックが届いたときのみ)
+                #print(ema)
+                if len(values) > 0:
+                    detected_seq = reader.next - 1
+                    tracer.mark(detected_seq, STAGE_DETECTED)
+                    if SPECTRAL_DETECTION and BLOCK_SAMPLING:
+                        detected = detect_smile_spectral(
+                            values[-1, PIPE_FIELDS.index("power")],
+                            values[-1, PIPE_FIELDS.index("ratio")])
+                    else:
+                        detected = detect_smile(ema)
+                    if recalibrator is not None:
+                        for value in values[:, PIPE_FIELDS.index("mean")]:
+                            recalibrator.update(value, detected)
+                    if detected:
+                        if not smiling:
+                            smiling = True
+                    else:
+                        if smiling:
+                            smiling = False
+
+                # ハニカム増減
+                if smiling:
+                    if game_time - start_time > update_time:
+                        if num_of_honeycombs < field_info["num_of_hcs"]:
+                            num_of_honeycombs += 1
+                            activate_honeycomb(field_info, num_of_honeycombs)
+                            start_time = game_time
+                            tracer.mark(detected_seq, STAGE_ACTIVATED)
+                            activated_seqs.append(detected_seq)
+                else:
+                    if game_time - start_time > update_time:
+                        if num_of_honeycombs > 0:
+                            deactivate_honeycomb(field_info, num_of_honeycombs)
+                            num_of_honeycombs -= 1
+                            start_time = game_time
+                            tracer.mark(detected_seq, STAGE_ACTIVATED)
+                            activated_seqs.append(detected_seq)
+            clock.mark("logic")
+
+            # 描画 (変化した領域のみ)
+            rects = hc_layer.update() + gauge.update(
+                pipe.latest("ema")[0], emgs_ema.snapshot(SPARK_LEN))
+            update_screen(screen, layers, rects)
+            for seq in activated_seqs:
+                tracer.mark(seq, STAGE_DISPLAYED)
+            activated_seqs.clear()
+            clock.mark("render")
 
             if num_of_honeycombs >= field_info["num_of_hcs"]:
-                time.sleep(1.0)
+                await clock.wait(1.0)
                 break
 
-            # 笑顔の判定
-            #print(emgs_ema[-1])
-            if detect_smile(emgs_ema[-1]):
-                if not smiling:
-                    smiling = True
-            else:
-                if smiling:
-                    smiling = False
-
-            # ハニカム増減
-            current_time = time.time()
-            if smiling:
-                if current_time - start_time > update_time:
-                    if num_of_honeycombs <= MAX_HC:
-                        num_of_honeycombs += 1
-                        activate_honeycomb(field_info, num_of_honeycombs)
-                        start_time = current_time
-            else:
-                if current_time - start_time > update_time:
-                    if num_of_honeycombs > 0:
-                        deactivate_honeycomb(field_info, num_of_honeycombs)
-                        num_of_honeycombs -= 1
-                        start_time = current_time
-
-            #time.sleep(0.01)
+            await clock.tick()
+
+        stats = clock.stats()
+        print("FRAME:", ", ".join(f"{k} {v:.2f}" for k, v in stats.items()),
+              file=sys.stderr)
+        print(f"PIPE: drops {reader.drops}, max age {max_age*1000:.1f} ms",
+              file=sys.stderr)
+        print(f"CRITERIA: smiling_ave {criteria['smiling_ave']:.4f} mV",
+              file=sys.stderr)
 
         screen.fill(color=BG_COLOR)
         screen.blit(font.render(f"Clear!", True, (32, 32, 32)), (300, 200))
         pygame.display.update()
-        start_time = time.time()
-        while time.time() - start_time < 5.0:
-            time.sleep(0.05)
+        await clock.wait(STAGE_CLEAR_TIME)
 
         field_num += 1
 
-    stop_event.set()
-
 
 if __name__ == "__main__":
     # pygame 初期化
     pygame.init()
-    screen = pygame.display.set_mode(size=(SCREEN_W, SCREEN_H))
+    screen = pygame.display.set_mode(
+        size=(SCREEN_W, SCREEN_H),
+        flags=pygame.SCALED if VSYNC else 0,
+        vsync=int(VSYNC))
 
     # ハニカム準備
-    load_hc_imgs(IMG_DIR)
-
-    # デバイスの取得
-    while True:
-        device = get_device(MAC_ADDRESS)
-        if type(device) == bitalino.BITalino:
-            break
-        print("ERROR: Could not get the device.", file=sys.stderr)
-
-    # 計測準備
-    start_device(device)
-
-    # スレッド・共有資源の用意
-    accs = []
-    emgs = []
-    emgs_ema = []
-
-    sample_t = threading.Thread(
-        target=sample_t_func, args=[device, accs, emgs, emgs_ema])
-    main_t = threading.Thread(
-        target=main_t_func, args=[device, screen, accs, emgs, emgs_ema])
-
-    # メインルーチン
-    sample_t.start()
-    main_t.start()
+    load_hc_imgs(IMG_DIR, SCREEN_SIZE)
+
+    # デバイスの取得 (引数で "replay:..." を指定すると記録データを再生する)
+    mac_address = sys.argv[1] if len(sys.argv) > 1 else MAC_ADDRESS
+    sampler = None
+    if PROCESS_SAMPLING:
+        # デバイスとの接続とサンプリングはサンプリング用プロセスで行う
+        device = None
+        sampler = SamplerProcess(
+            mac_address, MAX_BLOCK_DATA_LEN, PIPE_CAPACITY, PIPE_FIELDS)
+        accs, emgs, emgs_ema = sampler.accs, sampler.emgs, sampler.emgs_ema
+        pipe = sampler.pipe
+    else:
+        while True:
+            device = get_device(mac_address)
+            if device is not None:
+                break
+            print("ERROR: Could not get the device.", file=sys.stderr)
+            time.sleep(GET_DEVICE_INTERVAL)
+
+        # 計測準備
+        start_device(device)
+
+        # 共有資源の用意
+        buffer_len = MAX_BLOCK_DATA_LEN if BLOCK_SAMPLING else MAX_DATA_LEN
+        accs = RingBuffer(buffer_len)
+        emgs = RingBuffer(buffer_len)
+        emgs_ema = RingBuffer(buffer_len)
+        pipe = SamplePipe(PIPE_CAPACITY, PIPE_FIELDS)
+    features = {}
+    tracer = Tracer() if TRACE_LATENCY else NullTracer()
+    session = None
+    if SESSION_LOG:
+        session = SessionLog(
+            os.path.join(LOG_DIR, make_filename("session" + SESSION_EXT)))
+
+    # メインルーチン (ゲーム, イベント処理, サンプリングを 1 つの
+    # イベントループで動かし, どれかが終わったら全体を止める)
+    tasks = [
+        mainloop(screen, emgs_ema, pipe, tracer, session),
+        pump_events(),
+    ]
+    if sampler is None:
+        tasks.append(repeat_in_executor(
+            sample_once, device, accs, emgs, emgs_ema, features, pipe,
+            tracer, SpectralDetector()))
+    else:
+        sampler.start()
+        tasks.append(wait_until(lambda: not sampler.process.is_alive()))
 
     try:
-        while not stop_event.is_set():
-            for event in pygame.event.get():
-                if event.type == pygame.locals.QUIT:
-                    pygame.quit()
-                    raise KeyboardInterrupt
+        asyncio.run(run_until_first(*tasks))
     except KeyboardInterrupt:
-        stop_event.set()
-        sample_t.join()
-        main_t.join()
+        pass
+    finally:
+        pygame.quit()
+        if sampler is not None:
+            sampler.stop()
+        tracer.dump(
+            os.path.join(LATENCY_LOG_DIR, make_filename("latency.csv")))
+        if session is not None:
+            session.close()
@@ -0,0 +1,133 @@
+import asyncio
+import sys
+
+import pygame
+
+from modules.clock import FrameClock
+from modules.facial import (
+    GAUGE_W,
+    GAUGE_X,
+    SPARK_LEN,
+    Gauge,
+    calibrate,
+    detect_smile,
+)
+from modules.hub import entries_from_addresses, load_config, open_hub
+from modules.runtime import pump_events, run_until_first, wait_until
+
+
+# 画面の設定 (プレイヤーごとに 1 段)
+SCREEN_W = 560
+ROW_H = 120
+MIN_SCREEN_H = 240  # キャリブレーションの説明が収まる高さ
+
+BG_COLOR = (200, 200, 200)
+FONT_COLOR = (32, 32, 32)
+
+FPS = 30
+
+# プレイヤー名と判定結果の表示
+LABEL_X = GAUGE_X + GAUGE_W + 24
+LABEL_Y = 24
+LABEL_W = SCREEN_W - LABEL_X
+LABEL_H = 40
+LABEL_SIZE = 40
+
+
+def usage():
+    print("Usage: python app4.py ADDRESS [ADDRESS ...]\n"
+          "       python app4.py --config FILE\n"
+          "ADDRESS is a MAC address or \"replay:<glob>@<speed>\".",
+          file=sys.stderr)
+
+
+async def mainloop(screen, hub):
+    """全プレイヤーのキャリブレーションの後, 時刻をそろえた EMA で
+    プレイヤーごとのゲージと判定結果を表示し続ける."""
+    await wait_until(hub.ready)
+
+    # プレイヤーごとに順にキャリブレーション (criteria はプレイヤー専用)
+    for station in hub.stations:
+        await calibrate(
+            screen, station.pipe, criteria=station.criteria,
+            title=f"Measurement ({station.name})")
+
+    font = pygame.font.Font(None, LABEL_SIZE)
+    clock = FrameClock(FPS)
+    gauges = [
+        Gauge(criteria=station.criteria, offset=(0, i*ROW_H))
+        for i, station in enumerate(hub.stations)]
+    smiling = [None] * len(hub)
+    max_spread = 0.0
+
+    screen.fill(BG_COLOR)
+    pygame.display.update()
+    try:
+        while True:
+            _, emas = hub.aligned("ema")
+            ages = hub.ages()
+            max_spread = max(max_spread, max(ages) - min(ages))
+
+            rects = []
+            for i, (station, gauge, ema) in enumerate(
+                    zip(hub.stations, gauges, emas)):
+                for rect in gauge.update(
+                        ema, station.emgs_ema.snapshot(SPARK_LEN)):
+                    screen.fill(BG_COLOR, rect)
+                    screen.blit(gauge.surface, rect)
+                    rects.append(rect)
+
+                detected = detect_smile(ema, station.criteria)
+                if detected != smiling[i]:
+                    smiling[i] = detected
+                    rect = pygame.Rect(
+                        LABEL_X, i*ROW_H + LABEL_Y, LABEL_W, LABEL_H)
+                    state = "Smile!" if detected else "..."
+                    screen.fill(BG_COLOR, rect)
+                    screen.blit(
+                        font.render(f"{station.name}: {state}", True,
+                                    FONT_COLOR), rect)
+                    rects.append(rect)
+            pygame.display.update(rects)
+            clock.mark("render")
+
+            await clock.tick()
+    finally:
+        stats = clock.stats()
+        print("FRAME:", ", ".join(f"{k} {v:.2f}" for k, v in stats.items()),
+              file=sys.stderr)
+        print(f"ALIGN: max spread {max_spread*1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    # デバイスの一覧 (設定ファイルか, アドレスを並べて指定する)
+    args = sys.argv[1:]
+    if len(args) == 2 and args[0] == "--config":
+        entries = load_config(args[1])
+    elif len(args) > 0 and not args[0].startswith("--"):
+        entries = entries_from_addresses(args)
+    else:
+        usage()
+        exit(1)
+
+    hub = open_hub(entries)
+    if hub is None:
+        exit(1)
+
+    pygame.init()
+    screen = pygame.display.set_mode(
+        size=(SCREEN_W, max(ROW_H * len(hub), MIN_SCREEN_H)))
+
+    # メインルーチン (QUIT か, いずれかのデバイスの読み出しの失敗で終わる)
+    hub.start()
+    try:
+        asyncio.run(run_until_first(
+            mainloop(screen, hub),
+            pump_events(),
+            wait_until(lambda: any(
+                station.error is not None for station in hub.stations))))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pygame.quit()
+        hub.stop()
@@ -0,0 +1,131 @@
+import glob
+import os
+
+import numpy as np
+
+from modules.device import (
+    BITS,
+    DATA_DIR,
+    EMG_PIN,
+    EMGS_EMA_RHO_BLOCK,
+    GAIN,
+    VCC,
+    calc_emg,
+)
+from modules.facial import LOG_DIR, SMILE_THD
+from modules.filters import ema
+from modules.recording import (
+    RECORDING_EXT,
+    open_recording,
+    parse_filename,
+    read_signal,
+)
+from modules.session import SESSION_EXT, read_session
+
+
+# ファイル
+ROOT_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", ".."))
+CAL_DIR = LOG_DIR
+OUT_DIR = os.path.join(ROOT_DIR, "log", "analysis")
+
+# 比較用の EMA の係数 (1 サンプルごと). 閾値の判定にはゲームと同じ
+# EMGS_EMA_RHO_BLOCK の EMA を使う.
+EMA_RHOS = [0.80, 0.90, 0.95]
+
+COLUMNS = [
+    "file", "kind", "mode", "samples", "mean_abs", "rms",
+    "ema80_mean", "ema90_mean", "ema95_mean",
+    "env_mean", "env_std", "env_p95", "above_thd", "crossings",
+]
+
+
+def read_calibration(filename):
+    """キャリブレーションのログ (time, img) から img の列を読み込む."""
+    return np.loadtxt(filename, delimiter=",", skiprows=1, ndmin=2)[:, 1]
+
+
+def emg_column(header):
+    """記録ファイルのヘッダから, EMG (EMG_PIN) の列の番号を返す.
+
+    CSV から変換した 1 チャンネルの記録 (ピン番号なし) は EMG とみなす.
+    """
+    pins = header["pins"]
+    if EMG_PIN in pins:
+        return pins.index(EMG_PIN)
+    if pins == [None]:
+        return 0
+    raise ValueError(f"EMG (pin {EMG_PIN}) is not recorded (pins {pins}).")
+
+
+def envelope_features(env):
+    """包絡線の統計量と, 閾値 SMILE_THD を上回る割合・回数を計算する."""
+    above = env > SMILE_THD
+    return {
+        "env_mean": float(env.mean()),
+        "env_std": float(env.std()),
+        "env_p95": float(np.percentile(env, 95)),
+        "above_thd": float(above.mean()),
+        "crossings": int(np.count_nonzero(above[1:] & ~above[:-1])),
+    }
+
+
+def analyze_file(filename, kind):
+    """1 ファイル分の特徴量を計算し, 行 (dict) のリストを返す.
+
+    セッションのログはフェーズごとに 1 行とする.
+    """
+    if kind == "session":
+        rows = []
+        for phase, (_, values) in read_session(filename).items():
+            # img は整流済みの EMA (mV)
+            env = values[:, 0]
+            features = {
+                "kind": kind, "mode": phase, "samples": len(env),
+                "mean_abs": float(values[:, 1].mean())}
+            features.update(envelope_features(env))
+            rows.append(features)
+        return rows
+
+    _, mode = parse_filename(filename)
+    features = {"kind": kind, "mode": mode}
+    if kind == "calibration":
+        # img は整流済みの EMA (mV)
+        env = read_calibration(filename)
+        features.update(samples=len(env), mean_abs=float(np.abs(env).mean()))
+    else:
+        if filename.endswith(RECORDING_EXT):
+            header, data = open_recording(filename)
+            emg = calc_emg(
+                data[:, emg_column(header)],
+                header["bits"], header["vcc"], header["gain"])
+        else:
+            _, data = read_signal(filename)
+            emg = calc_emg(data, BITS, VCC, GAIN)
+        emg_abs = np.abs(emg)
+        emas = ema(emg_abs, EMA_RHOS)
+        env = ema(emg_abs, EMGS_EMA_RHO_BLOCK)
+        features.update(
+            samples=len(emg),
+            mean_abs=float(emg_abs.mean()),
+            rms=float(np.sqrt(np.mean(emg**2))),
+            ema80_mean=float(emas[0].mean()),
+            ema90_mean=float(emas[1].mean()),
+            ema95_mean=float(emas[2].mean()))
+    features.update(envelope_features(env))
+    return [features]
+
+
+def list_files():
+    """解析するファイルと種類の組を列挙する."""
+    files = [
+        (f, "data") for f in sorted(
+            glob.glob(os.path.join(DATA_DIR, "*.csv"))
+            + glob.glob(os.path.join(DATA_DIR, "*" + RECORDING_EXT)))]
+    files += [
+        (f, "calibration")
+        for f in sorted(glob.glob(os.path.join(CAL_DIR, "*.csv")))]
+    files += [
+        (f, "session")
+        for f in sorted(glob.glob(os.path.join(CAL_DIR, "*" + SESSION_EXT)))]
+    return files
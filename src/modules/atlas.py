@@ -0,0 +1,98 @@
+import glob
+import json
+import os
+import sys
+
+import pygame
+
+
+# ファイル
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+CACHE_DIR = os.path.join(ROOT_DIR, "assets", "cache")
+
+
+class SpriteAtlas:
+    """同じ大きさの画像を横に並べて 1 枚にまとめたスプライトアトラス.
+
+    各画像はアトラスのサブサーフェイスとして frames から取り出せる.
+    """
+
+    def __init__(self, surface, labels, size):
+        self.surface = surface
+        self.labels = labels
+        self.size = size
+        self.frames = {
+            label: surface.subsurface((i*size, 0, size, size))
+            for i, label in enumerate(labels)}
+
+
+def get_mtimes(img_dir, labels):
+    """元画像の更新時刻を取得する."""
+    return {
+        label: os.path.getmtime(os.path.join(img_dir, label))
+        for label in labels}
+
+
+def build_atlas_surface(img_dir, labels, size):
+    """元画像を読み込み, 縮小してアトラスのサーフェイスを作る."""
+    surface = pygame.surface.Surface((size*len(labels), size), pygame.SRCALPHA)
+    for i, label in enumerate(labels):
+        img = pygame.image.load(os.path.join(img_dir, label))
+        img = pygame.transform.scale(img, (size, size))
+        surface.blit(img, (i*size, 0))
+    return surface
+
+
+def evict_stale_atlases(name, mtimes):
+    """元画像の更新時刻が変わったキャッシュを削除する."""
+    for manifest_path in glob.glob(os.path.join(CACHE_DIR, f"{name}_*.json")):
+        try:
+            with open(manifest_path) as f:
+                cached_mtimes = json.load(f)["mtimes"]
+            stale = any(
+                cached_mtimes.get(label) != mtime
+                for label, mtime in mtimes.items())
+        except (OSError, ValueError, KeyError):
+            stale = True
+        if stale:
+            os.remove(manifest_path)
+            img_path = manifest_path[:-len(".json")] + ".png"
+            if os.path.exists(img_path):
+                os.remove(img_path)
+
+
+def load_atlas(name, img_dir, labels, size, screen_size):
+    """スプライトアトラスを読み込む.
+
+    縮小済みのアトラスは大きさと画面の解像度ごとにディスクへキャッシュし,
+    元画像の更新時刻が変わらない限り再利用する. 画面が初期化済みの場合は
+    画面のピクセル形式に変換する.
+    """
+    mtimes = get_mtimes(img_dir, labels)
+    evict_stale_atlases(name, mtimes)
+
+    w, h = (int(i) for i in screen_size)
+    base = os.path.join(CACHE_DIR, f"{name}_{size}_{w}x{h}")
+    manifest = {"labels": labels, "size": size, "mtimes": mtimes}
+    try:
+        with open(base + ".json") as f:
+            cached = json.load(f) == manifest
+    except (OSError, ValueError):
+        cached = False
+
+    if cached:
+        surface = pygame.image.load(base + ".png")
+    else:
+        surface = build_atlas_surface(img_dir, labels, size)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            pygame.image.save(surface, base + ".png")
+            with open(base + ".json", "w") as f:
+                json.dump(manifest, f)
+        except (OSError, pygame.error):
+            print(f"WARNING: Could not save the atlas cache '{base}'.",
+                  file=sys.stderr)
+
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert_alpha()
+    return SpriteAtlas(surface, labels, size)
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class RingBuffer:
+    """NumPy 配列による固定長のリングバッファ.
+
+    書き込みは 1 スレッド, 読み出しは複数スレッドから行うことを想定する.
+    同じ値を配列の前半と後半の 2 箇所に書き込むことで, 直近の任意の区間を
+    コピーなしの連続したビューとして返せるようにしている.
+
+    seq は書き込みのたびに 2 ずつ増えるシーケンス番号で, 書き込み中は奇数
+    になる. 読み出し側は seq が偶数かつ読み出しの前後で変わっていないこと
+    で, 読み出した値が書き込みと競合していないことを確認できる.
+    """
+
+    def __init__(self, capacity, dtype=float):
+        self.capacity = capacity
+        self.seq = 0
+        self._data = np.zeros(2*capacity, dtype=dtype)
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, value):
+        """値を 1 つ追加する."""
+        cap = self.capacity
+        self.seq += 1
+        self._data[self._head] = value
+        self._data[self._head + cap] = value
+        self._head = (self._head + 1) % cap
+        self._count = min(self._count + 1, cap)
+        self.seq += 1
+
+    def extend(self, block):
+        """ブロックをまとめて追加する."""
+        cap = self.capacity
+        block = np.asarray(block)[-cap:]
+        n = len(block)
+        if n == 0:
+            return
+        self.seq += 1
+        head = self._head
+        first = min(n, cap - head)
+        self._data[head:head + first] = block[:first]
+        self._data[head + cap:head + cap + first] = block[:first]
+        rest = n - first
+        if rest > 0:
+            self._data[:rest] = block[first:]
+            self._data[cap:cap + rest] = block[first:]
+        self._head = (head + n) % cap
+        self._count = min(self._count + n, cap)
+        self.seq += 1
+
+    def latest(self):
+        """最新の値を返す."""
+        if self._count == 0:
+            raise IndexError("latest() from empty buffer")
+        return self._data[self._head - 1 + self.capacity].item()
+
+    def window(self, n=None):
+        """直近 n 個の値の読み取り専用ビューを返す (コピーなし).
+
+        ビューは以降の書き込みで上書きされうる. 一貫した値が必要な場合は
+        snapshot を使う.
+        """
+        n = self._count if n is None else min(n, self._count)
+        end = self._head + self.capacity
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def snapshot(self, n=None):
+        """直近 n 個の値のコピーを, 書き込みと競合しないように取得する."""
+        while True:
+            seq = self.seq
+            if seq % 2 == 0:
+                data = self.window(n).copy()
+                if seq == self.seq:
+                    return data
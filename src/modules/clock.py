@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+
+# フレームレートの設定
+TARGET_FPS = 30
+LOGIC_RATE = 20  # Hz
+
+MAX_LOGIC_STEPS = 5  # 1 フレームで進めるロジックの最大回数
+
+TIMING_LABELS = ["logic", "render", "idle"]
+
+
+class FrameClock:
+    """フレームレート制御.
+
+    描画はフレームごとに 1 回行い, ゲームロジックは描画とは独立に固定の
+    時間刻み (logic_dt) で必要な回数だけ進める. vsync が有効な場合は
+    画面の更新が垂直同期を待つので, tick では待機しない.
+
+    tick と wait はコルーチンで, 待つ間はイベントループに制御を返す
+    (pygame のイベント処理などの他のタスクが動く).
+
+    フレーム内の各処理の時間 (ms) を mark で区切って記録する.
+    """
+
+    def __init__(self, fps=TARGET_FPS, logic_rate=LOGIC_RATE, vsync=False):
+        self.fps = fps
+        self.logic_dt = 1 / logic_rate
+        self.vsync = vsync
+
+        self.timing = {label: 0.0 for label in TIMING_LABELS}
+        self.total = {label: 0.0 for label in TIMING_LABELS}
+        self.frames = 0
+
+        self.reset()
+
+    def reset(self):
+        """経過時間の計測をやり直す (待機画面の後などに呼ぶ)."""
+        self.accumulator = 0.0
+        self.last_time = time.perf_counter()
+        self.mark_time = self.last_time
+        self.next_frame_time = self.last_time
+
+    def logic_steps(self):
+        """前回から経過した時間に応じて, ロジックを進める回数を返す."""
+        current_time = time.perf_counter()
+        self.accumulator += current_time - self.last_time
+        self.last_time = current_time
+        steps = int(self.accumulator // self.logic_dt)
+        self.accumulator -= steps * self.logic_dt
+        if steps > MAX_LOGIC_STEPS:
+            # 大きく遅れた場合は追いつこうとせず, 遅れを捨てる
+            steps = MAX_LOGIC_STEPS
+            self.accumulator = 0.0
+        return steps
+
+    def mark(self, label):
+        """前回の mark からの時間を label の処理時間として記録する."""
+        current_time = time.perf_counter()
+        self.timing[label] = (current_time - self.mark_time) * 1000
+        self.mark_time = current_time
+
+    async def tick(self):
+        """目標のフレームレートになるまで待ち, フレームを終える."""
+        if self.vsync:
+            await asyncio.sleep(0)
+        else:
+            # 遅れた場合は追いつこうとせず, 今から 1 フレーム後を目標にする
+            current_time = time.perf_counter()
+            self.next_frame_time = max(
+                self.next_frame_time + 1 / self.fps, current_time)
+            await asyncio.sleep(self.next_frame_time - current_time)
+        self.mark("idle")
+        for label in TIMING_LABELS:
+            self.total[label] += self.timing[label]
+        self.frames += 1
+
+    async def wait(self, seconds):
+        """描画を伴わない画面で指定した時間だけ待つ."""
+        await asyncio.sleep(seconds)
+        self.reset()
+
+    def stats(self):
+        """前回の stats 以降のフレームあたりの平均時間 (ms) と実際の FPS を
+        返し, 集計をやり直す (ステージごとに呼ぶ)."""
+        n = max(self.frames, 1)
+        stats = {label: self.total[label] / n for label in TIMING_LABELS}
+        # 各処理の時間の合計がフレームの間隔になる
+        frame_time = sum(stats[label] for label in TIMING_LABELS)
+        stats["fps"] = 1000 / frame_time if frame_time > 0 else 0.0
+        self.total = {label: 0.0 for label in TIMING_LABELS}
+        self.frames = 0
+        return stats
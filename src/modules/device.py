@@ -1,7 +1,14 @@
+import glob
+import math
+import os
 import sys
 import time
 
 import bitalino
+import numpy as np
+
+from modules import filters
+from modules.recording import read_signal
 
 
 # デバイス設定
@@ -21,9 +28,129 @@ MAX_DATA_LEN = 100
 
 EMGS_EMA_RHO = 0.80
 
+# ブロック処理 (全サンプル使用) 用の設定
+# 1 ブロックから 1 サンプルだけ採る従来の方式と時定数が揃うように EMA 係数を決める.
+EMGS_EMA_RHO_BLOCK = EMGS_EMA_RHO ** (1/N_SAMPLES)
+
+MAX_BLOCK_DATA_LEN = MAX_DATA_LEN * N_SAMPLES
+
+# リプレイ (記録データの再生) 用の設定
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+REPLAY_PREFIX = "replay:"
+REPLAY_SPEED = 1.0  # 0 の場合は最大速度
+
+replay_data = {}
+
+
+class ReplayDevice:
+    """記録済みの data/*.csv (または記録ファイル) を再生する疑似デバイス.
+
+    BITalino と同じく start, read, stop, close を持ち, read は同じ列構成
+    (シーケンス番号, デジタル 4 ch, アナログ ch) の配列を返す. 記録された
+    信号は pin のチャンネルに入れ, 他のアナログ ch は中央値で埋める.
+
+    speed は再生速度の倍率で, 1.0 で実時間, 0 で待ち時間なし (最大速度).
+    """
+
+    def __init__(self, filenames, speed=REPLAY_SPEED, pin=EMG_PIN, loop=True):
+        self.filenames = filenames
+        self.speed = speed
+        self.pin = pin
+        self.loop = loop
+        self.signal = np.concatenate([load_replay_data(f) for f in filenames])
+
+        self.sampling_rate = SAMPLING_RATE
+        self.channels = [pin]
+        self.pos = 0
+        self.next_time = 0.0
+
+    def start(self, sampling_rate=SAMPLING_RATE, analog_channels=(EMG_PIN,)):
+        self.sampling_rate = sampling_rate
+        # 実機と同じく, 重複を除いた昇順のチャンネルを列に並べる
+        self.channels = sorted(set(analog_channels))
+        self.pos = 0
+        self.next_time = time.perf_counter()
+
+    def read(self, n_samples=N_SAMPLES):
+        """n_samples 行分のデータを返す."""
+        if not self.loop and self.pos + n_samples > len(self.signal):
+            raise EOFError("The replay data has run out.")
+
+        # 実機と同じく, n_samples 分の時間が経つまで待つ
+        if self.speed > 0:
+            self.next_time += n_samples / (self.sampling_rate * self.speed)
+            wait = self.next_time - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+        indices = np.arange(self.pos, self.pos + n_samples)
+        self.pos += n_samples
+        data = np.empty((n_samples, 5 + len(self.channels)))
+        data[:, 0] = indices % 16
+        data[:, 1:5] = 0.0
+        data[:, 5:] = 2**(BITS - 1)
+        if self.pin in self.channels:
+            column = 5 + self.channels.index(self.pin)
+            data[:, column] = self.signal[indices % len(self.signal)]
+        return data
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def load_replay_data(filename):
+    """記録データ (CSV か記録ファイル) を読み込む.
+
+    一度読み込んだファイルは配列 (記録ファイルは memmap) のまま保持し,
+    再利用する.
+    """
+    filename = os.path.abspath(filename)
+    if filename not in replay_data:
+        replay_data[filename] = read_signal(filename)[1]
+    return replay_data[filename]
+
+
+def get_replay_device(spec):
+    """"<glob>@<speed>" 形式の指定からリプレイ用デバイスを生成する.
+
+    glob は data/ からの相対パスでもよい. speed は倍率か "max".
+    """
+    pattern, _, speed = spec.partition("@")
+    pattern = pattern or "*.csv"
+    filenames = sorted(glob.glob(pattern))
+    if len(filenames) == 0:
+        filenames = sorted(glob.glob(os.path.join(DATA_DIR, pattern)))
+    if len(filenames) == 0:
+        print(f"ERROR: Could not find replay data '{pattern}'.",
+              file=sys.stderr)
+        return None
+    if speed == "max":
+        return ReplayDevice(filenames, 0.0)
+    if not speed:
+        return ReplayDevice(filenames, REPLAY_SPEED)
+    try:
+        value = float(speed)
+    except ValueError:
+        value = math.nan
+    if not 0 < value < math.inf:
+        print(f"ERROR: Invalid replay speed '{speed}' "
+              "(a positive number or 'max').", file=sys.stderr)
+        return None
+    return ReplayDevice(filenames, value)
+
 
 def get_device(mac_address):
-    """BITalino デバイスと接続する."""
+    """BITalino デバイスと接続する.
+
+    "replay:" で始まるアドレスの場合は記録データを再生する
+    ReplayDevice を返す (例: "replay:*_v1_smile.csv@4").
+    """
+    if mac_address.startswith(REPLAY_PREFIX):
+        return get_replay_device(mac_address[len(REPLAY_PREFIX):])
     device = None
     try:
         device = bitalino.BITalino(mac_address)
@@ -44,34 +171,53 @@ def calc_emg(data, bits, vcc, gain):
     return emg
 
 
-def calc_ema(old, new, rho):
-    """指数移動平均 (EMA) を計算する."""
-    return rho*old + (1 - rho)*new
-
-
-def add_ema(ema_list, new, rho):
-    """指数移動平均 (EMA) を計算し, リストに追加する."""
-    if len(ema_list) > 0:
-        ema = calc_ema(ema_list[-1], new, rho)
-    else:
-        ema = new
-    ema_list.append(ema)
-
-
 def sample_data(device, accs, emgs, emgs_ema):
-    """生体データをサンプリングする."""
+    """生体データをサンプリングする.
+
+    accs, emgs, emgs_ema には RingBuffer を渡す.
+    """
     # データ取得
     data = device.read(N_SAMPLES)
     acc = data[:, 5+ACC_PIN][0]
     emg = calc_emg(data[:, 5+EMG_PIN][0], BITS, VCC, GAIN)
+    init = emgs_ema.latest() if len(emgs_ema) > 0 else None
+    ema = filters.ema([abs(emg)], EMGS_EMA_RHO, init)[0]
 
-    # データ追加・廃棄
+    # データ追加 (古いデータはバッファが上書きする)
     accs.append(acc)
-    if len(accs) > MAX_DATA_LEN:
-        del accs[:-MAX_DATA_LEN]
-
     emgs.append(emg)
-    add_ema(emgs_ema, abs(emg), EMGS_EMA_RHO)
-    if len(emgs) > MAX_DATA_LEN:
-        del emgs[:-MAX_DATA_LEN]
-        del emgs_ema[:-MAX_DATA_LEN]
+    emgs_ema.append(ema)
+
+
+def sample_block(device, accs, emgs, emgs_ema, features, detector=None):
+    """生体データをブロック単位でサンプリングする.
+
+    read したブロックの全サンプルを変換・整流し, EMA をまとめて計算する.
+    EMA の状態は features["ema"] を通じて次のブロックへ引き継ぐ.
+    features にはブロックの特徴量 (最後の値, 平均, RMS) と, ブロックを
+    受け取った時刻 (time.monotonic) も格納する.
+    detector (SpectralDetector) を渡すと, EMG の帯域のパワーとその割合も
+    features["power"], features["ratio"] に格納する.
+    accs, emgs, emgs_ema には RingBuffer を渡す.
+    """
+    # データ取得
+    data = device.read(N_SAMPLES)
+    read_time = time.monotonic()
+    acc = data[:, 5+ACC_PIN]
+    emg = calc_emg(data[:, 5+EMG_PIN], BITS, VCC, GAIN)
+    emg_abs = np.abs(emg)
+    ema = filters.ema(emg_abs, EMGS_EMA_RHO_BLOCK, features.get("ema"))
+
+    # 特徴量
+    features["time"] = read_time
+    features["ema"] = float(ema[-1])
+    features["last"] = float(emg[-1])
+    features["mean"] = float(emg_abs.mean())
+    features["rms"] = float(np.sqrt(np.mean(emg**2)))
+    if detector is not None:
+        features["power"], features["ratio"] = detector.update(emg)
+
+    # データ追加 (古いデータはバッファが上書きする)
+    accs.extend(acc)
+    emgs.extend(emg)
+    emgs_ema.extend(ema)
@@ -1,15 +1,14 @@
-import csv
+import asyncio
 import datetime
 import os
-import statistics
 import sys
 import time
 
+import numpy as np
 import pygame
 
-from modules.device import (
-    sample_data,
-)
+from modules.spectral import is_smile, power_threshold
+from modules.stats import LevelStats, RunningStats
 
 
 # ファイル
@@ -38,10 +37,21 @@ BAR_Y = GAUGE_Y - 2
 BAR_W = 2
 BAR_H = GAUGE_H + 4
 
+GAUGE_AREA = (GAUGE_X, BAR_Y, GAUGE_W, BAR_H)  # ゲージが描画されうる範囲
+
 GAUGE_COLOR_EMPTY = (128, 64, 0)
 GAUGE_COLOR_FULL = (210, 210, 0)
 GAUGE_COLOR_BAR = (32, 32, 32)
 
+# ゲージの下に表示する直近の EMA の推移 (スパークライン)
+SPARK_X = GAUGE_X
+SPARK_Y = BAR_Y + BAR_H + 4
+SPARK_W = GAUGE_W
+SPARK_H = 24
+SPARK_LEN = 3000  # サンプル (1 kHz で 3 s)
+
+SPARK_COLOR = (64, 64, 64)
+
 # 画面
 BG_COLOR = (200, 200, 200)
 
@@ -56,10 +66,25 @@ CAL_FONT_COLOR = (32, 32, 32)
 
 CAL_COOL_TIME = 6.0
 
-CAL_DURATION = 5.0
+CAL_DURATION = 5.0  # s (最大)
+CAL_MIN_DURATION = 1.5  # s
+
+# 平均の 95 % 信頼区間の半幅が平均のこの割合以下になったら測定を終える
+CAL_TOLERANCE = 0.1
+
+CAL_QUANTILES = (0.1, 0.5, 0.9)
 
+CAL_POLL_INTERVAL = 0.05  # s
 
-def countdown_for_mes(screen, title, description):
+# プレイ中の再キャリブレーション
+RECAL_HALF_LIFE = 600  # ブロック (60 s)
+RECAL_MIN_BLOCKS = 20  # ブロック
+RECAL_MIN_SMILING = 0.01  # mV (smiling_ave の下限)
+# 判定の閾値 (smiling_ave * THD_RATE) をベースラインのこの倍以上に保つ
+RECAL_MARGIN = 1.25
+
+
+async def countdown_for_mes(screen, title, description):
     """測定前のカウントダウン."""
     font1 = pygame.font.SysFont(None, CAL_TITLE_SIZE)
     font2 = pygame.font.SysFont(None, CAL_DESCR_SIZE)
@@ -67,28 +92,17 @@ def countdown_for_mes(screen, title, description):
     screen.blit(font1.render(title, True, CAL_FONT_COLOR), CAL_TITLE_POS)
     screen.blit(font2.render(description, True, CAL_FONT_COLOR), CAL_DESCR_POS)
     pygame.display.update()
-    start_time = time.time()
-    while time.time() - start_time < CAL_COOL_TIME:
-        time.sleep(0.05)
-    start_time = 0.0
-    count = 4
-    while count > 0:
-        current_time = time.time()
-        if current_time - start_time > 1.0:
-            count -= 1
-            start_time = current_time
-            if count <= 0:
-                break
-            screen.fill(color=BG_COLOR)
-            screen.blit(
-                font1.render(str(count), True, CAL_FONT_COLOR), CAL_TITLE_POS)
-            pygame.display.update()
+    await asyncio.sleep(CAL_COOL_TIME)
+    for count in range(3, 0, -1):
+        screen.fill(color=BG_COLOR)
+        screen.blit(
+            font1.render(str(count), True, CAL_FONT_COLOR), CAL_TITLE_POS)
+        pygame.display.update()
+        await asyncio.sleep(1.0)
     screen.fill(color=BG_COLOR)
     screen.blit(font1.render("Go!", True, CAL_FONT_COLOR), CAL_TITLE_POS)
     pygame.display.update()
-    start_time = time.time()
-    while time.time() - start_time < 1.0:
-        time.sleep(0.05)
+    await asyncio.sleep(1.0)
     screen.fill(color=BG_COLOR)
     pygame.display.update()
 
@@ -100,79 +114,177 @@ def make_filename(description):
     return filename
 
 
-def measure_baseline(emgs):
+async def measure_level(pipe, phase, session=None):
+    """パイプの全ブロックから EMG の強さを測定し, LevelStats を返す.
+
+    各ブロックの整流した EMG の平均を逐次集計し, CAL_MIN_DURATION 以降に
+    平均の信頼区間が収束するか, CAL_DURATION が経過したら終える.
+    session (SessionLog) を渡すと, ブロックの EMA と平均を phase として
+    記録する.
+    """
+    stats = LevelStats(CAL_QUANTILES)
+    cols = [pipe.fields.index("ema"), pipe.fields.index("mean")]
+    n_blocks = 0
+    reader = pipe.reader()
+    start_time = time.monotonic()
+    while True:
+        values, times = reader.read()
+        for value in values[:, cols[1]]:
+            stats.push(value.item())
+        if session is not None:
+            session.log(phase, times, values[:, cols])
+        n_blocks += len(values)
+
+        elapsed = time.monotonic() - start_time
+        if elapsed >= CAL_DURATION or (
+                elapsed >= CAL_MIN_DURATION
+                and stats.converged(CAL_TOLERANCE)):
+            break
+        await asyncio.sleep(CAL_POLL_INTERVAL)
+
+    print(f"MEASURED: {n_blocks} blocks in {elapsed:.1f} s,",
+          ", ".join(f"{k} {v:.4g}" for k, v in stats.summary().items()),
+          file=sys.stderr)
+    return stats
+
+
+async def measure_baseline(pipe, session=None, criteria=criteria):
     """ベースライン電圧の測定."""
-    emg_data = []
-    time_data = []
-    start_time = time.time()
-    while time.time() - start_time < CAL_DURATION:
-        time_data.append(time.time() - start_time)
-        emg_data.append(emgs[-1])
-        time.sleep(0.01)
-    filename = make_filename("baseline.csv")
-    with open(os.path.join(LOG_DIR, filename), "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerows(
-            [["time", "img"]] + [list(i) for i in zip(time_data, emg_data)])
-    ave = statistics.mean(emg_data)
-    criteria["baseline_ave"] = ave
+    stats = await measure_level(pipe, "baseline", session)
+    criteria["baseline_ave"] = stats.mean
     print("AVERAGE:", criteria["baseline_ave"], "mV", file=sys.stderr)
 
 
-def measure_smiling(device, emgs):
+async def measure_smiling(pipe, session=None, criteria=criteria):
     """笑顔時の電圧の測定."""
-    emg_data = []
-    time_data = []
-    start_time = time.time()
-    while time.time() - start_time < CAL_DURATION:
-        #sample_data(device, [], [], emgs)
-        time_data.append(time.time() - start_time)
-        emg_data.append(emgs[-1])
-        time.sleep(0.01)
-    #filename = make_filename("smiling.csv")
-    #with open(os.path.join(LOG_DIR, filename), "w", newline="") as f:
-    #    writer = csv.writer(f)
-    #    writer.writerows(
-    #        [["time", "img"]] + [list(i) for i in zip(time_data, emg_data)])
-    ave = statistics.mean(emg_data)
-    criteria["smiling_ave"] = ave
+    stats = await measure_level(pipe, "smiling", session)
+    criteria["smiling_ave"] = stats.mean
     print("AVERAGE:", criteria["smiling_ave"], "mV", file=sys.stderr)
 
 
-def calibrate(device, screen, emgs):
-    """電圧値をキャリブレーションする."""
-    countdown_for_mes(
+async def calibrate(screen, pipe, session=None, criteria=criteria,
+                    title="Measurement"):
+    """電圧値をキャリブレーションする.
+
+    複数人の場合は title にプレイヤーの名前を入れる.
+    """
+    await countdown_for_mes(
         screen,
-        "Measurement",
+        title,
         "Please keep smiling "
-        f"for {CAL_DURATION} seconds.")
-    measure_smiling(device, emgs)
-
-
-def detect_smile(emg):
+        f"for up to {CAL_DURATION} seconds.")
+    await measure_smiling(pipe, session, criteria)
+
+
+class Recalibrator:
+    """プレイ中に閾値を電極の状態の変化に追従させる.
+
+    笑顔と判定されなかったブロックから, 古い値ほど軽く重み付けした
+    ベースラインを追跡し, その変化量だけ criteria["smiling_ave"] をずらす.
+    基準のベースラインは measure_baseline の結果か, 追跡を始めて最初に
+    RECAL_MIN_BLOCKS ブロック分が揃ったときの値.
+
+    ずらした値は RECAL_MIN_SMILING 以上で, かつ判定の閾値が追跡中の
+    ベースラインの RECAL_MARGIN 倍以上になるように制限する (ゲージなどで
+    smiling_ave で割るので, 0 以下にはしない).
+    """
+
+    def __init__(self, half_life=RECAL_HALF_LIFE, criteria=criteria):
+        self.stats = RunningStats(half_life)
+        self.criteria = criteria
+        self.reference = criteria.get("baseline_ave")
+        self.smiling_ave = criteria["smiling_ave"]
+
+    def update(self, level, smiling):
+        """ブロックの EMG の強さ (mV) と判定結果を渡す."""
+        if smiling:
+            return
+        self.stats.push(level)
+        if self.stats.count < RECAL_MIN_BLOCKS:
+            return
+        if self.reference is None:
+            self.reference = self.stats.mean
+        smiling_ave = self.smiling_ave + self.stats.mean - self.reference
+        lower = max(
+            RECAL_MIN_SMILING, self.stats.mean * RECAL_MARGIN / THD_RATE)
+        self.criteria["smiling_ave"] = max(smiling_ave, lower)
+
+
+def detect_smile(emg, criteria=criteria):
     """笑顔を検知する."""
     return emg > criteria["smiling_ave"] * THD_RATE
 
 
-def render_gauge(surface, emg):
-    """ゲージを描画する."""
-    pygame.draw.rect(
-        surface, GAUGE_COLOR_EMPTY, (GAUGE_X, GAUGE_Y, GAUGE_W, GAUGE_H))
-    pygame.draw.rect(
-        surface, GAUGE_COLOR_FULL, (
-            GAUGE_X,
-            GAUGE_Y,
-            min(GAUGE_W * emg / criteria["smiling_ave"], GAUGE_W),
-            GAUGE_H))
-    bar_x = GAUGE_W*THD_RATE - 1
-    pygame.draw.rect(
-        surface, GAUGE_COLOR_BAR, (bar_x, BAR_Y, BAR_W, BAR_H))
-
-
-def make_gauge_surface(screen_size, emg):
-    """ゲージを描画したサーフェイスを生成する."""
-    surface = pygame.surface.Surface(screen_size)
-    surface.fill(COLORKEY)
-    surface.set_colorkey(COLORKEY)
-    render_gauge(surface, emg)
-    return surface
+def detect_smile_spectral(power, ratio, criteria=criteria):
+    """EMG の帯域のパワーとその割合から笑顔を検知する.
+
+    首や眉の動きによる低い周波数のノイズでは誤検知しない.
+    """
+    return is_smile(
+        power, ratio, power_threshold(criteria["smiling_ave"] * THD_RATE))
+
+
+class Gauge:
+    """ゲージとスパークラインを描画した小さな永続的なレイヤ.
+
+    rect は画面上の位置と大きさ. update を呼ぶと, ピクセル単位に量子化
+    した表示が前回から変わった場合だけ描き直し, dirty rect のリストを返す.
+    offset を指定すると, 既定の位置からずらして表示する (複数人用).
+    """
+
+    def __init__(self, sparkline=True, criteria=criteria, offset=(0, 0)):
+        area = pygame.Rect(GAUGE_AREA)
+        if sparkline:
+            area.union_ip((SPARK_X, SPARK_Y, SPARK_W, SPARK_H))
+        self.origin = area.topleft
+        self.rect = area.move(offset)
+        self.criteria = criteria
+        self.surface = pygame.surface.Surface(self.rect.size)
+        self.surface.fill(COLORKEY)
+        self.surface.set_colorkey(COLORKEY)
+        self.sparkline = sparkline
+        self.drawn_level = None
+        self.drawn_spark = None
+
+    def quantize_spark(self, history):
+        """履歴を横 SPARK_W 列に分けて列ごとの最大値を取り, 各列の高さを返す."""
+        history = np.asarray(history)
+        n = len(history) // SPARK_W * SPARK_W
+        if n == 0:
+            return None
+        peaks = history[-n:].reshape(SPARK_W, -1).max(axis=1)
+        heights = SPARK_H * peaks / self.criteria["smiling_ave"]
+        return np.clip(heights, 0, SPARK_H - 1).astype(int)
+
+    def update(self, emg, history=None):
+        """ゲージの値 (と直近の EMA の履歴) を渡し, dirty rect を返す."""
+        level = int(
+            min(GAUGE_W * emg / self.criteria["smiling_ave"], GAUGE_W))
+        spark = None
+        if self.sparkline and history is not None:
+            spark = self.quantize_spark(history)
+        if level == self.drawn_level and (
+                spark is None or np.array_equal(spark, self.drawn_spark)):
+            return []
+
+        x0, y0 = self.origin
+        self.surface.fill(COLORKEY)
+        pygame.draw.rect(
+            self.surface, GAUGE_COLOR_EMPTY,
+            (GAUGE_X - x0, GAUGE_Y - y0, GAUGE_W, GAUGE_H))
+        pygame.draw.rect(
+            self.surface, GAUGE_COLOR_FULL,
+            (GAUGE_X - x0, GAUGE_Y - y0, level, GAUGE_H))
+        bar_x = GAUGE_W*THD_RATE - 1
+        pygame.draw.rect(
+            self.surface, GAUGE_COLOR_BAR,
+            (bar_x - x0, BAR_Y - y0, BAR_W, BAR_H))
+        if spark is not None:
+            points = np.column_stack([
+                SPARK_X - x0 + np.arange(SPARK_W),
+                SPARK_Y - y0 + SPARK_H - 1 - spark])
+            pygame.draw.lines(self.surface, SPARK_COLOR, False, points)
+
+        self.drawn_level = level
+        self.drawn_spark = spark
+        return [self.rect]
@@ -0,0 +1,70 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+SAMPLING_RATE = 1000  # Hz
+
+# スペクトルのパワーを求める帯域 (Hz)
+BANDS = [(20, 50), (50, 100), (100, 150), (150, 250), (250, 500)]
+
+# 一度に FFT する窓の数 (メモリの使用量を抑えるため)
+CHUNK_WINDOWS = 4096
+
+
+def sliding_windows(x, n, step=1):
+    """長さ n の窓を step サンプルずつずらした (窓の数, n) のビューを返す.
+
+    データはコピーしない (読み取り専用).
+    """
+    return sliding_window_view(np.asarray(x), n)[::step]
+
+
+def feature_names(bands=BANDS):
+    """window_features の列の名前を返す."""
+    return ["mean", "rms", "wl", "zc"] + [f"bp_{lo}_{hi}" for lo, hi in bands]
+
+
+def band_matrix(n, bands=BANDS, sampling_rate=SAMPLING_RATE):
+    """長さ n の rfft の各周波数を帯域に割り当てる (周波数の数, 帯域数) の行列."""
+    freqs = np.fft.rfftfreq(n, 1 / sampling_rate)
+    return np.stack([
+        (freqs >= lo) & (freqs < hi) for lo, hi in bands], axis=1).astype(float)
+
+
+def band_power(windows, bands=BANDS, sampling_rate=SAMPLING_RATE):
+    """窓ごとの帯域パワー (窓の数, 帯域数) を計算する.
+
+    窓の平均を引いてハン窓をかけ, 片側パワースペクトルを帯域ごとに合計する.
+    スペクトル全体の和が窓の分散になるように正規化する.
+    """
+    windows = np.atleast_2d(windows)
+    n = windows.shape[1]
+    taper = np.hanning(n)
+    scale = 2 / (n * np.sum(taper**2))
+    x = (windows - windows.mean(axis=1, keepdims=True)) * taper
+    power = np.abs(np.fft.rfft(x, axis=1))**2 * scale
+    return power @ band_matrix(n, bands, sampling_rate)
+
+
+def window_features(windows, bands=BANDS, sampling_rate=SAMPLING_RATE):
+    """窓ごとの特徴量 (窓の数, 特徴量の数) を計算する.
+
+    列は feature_names の順で, 平均, RMS, 波形長 (差分の絶対値の和),
+    平均を中心とした零交差の回数, 各帯域のパワー.
+    """
+    windows = np.atleast_2d(windows)
+    n_windows = len(windows)
+    n_bands = len(bands)
+    result = np.empty((n_windows, 4 + n_bands))
+    for start in range(0, n_windows, CHUNK_WINDOWS):
+        w = np.asarray(windows[start:start + CHUNK_WINDOWS], dtype=float)
+        out = result[start:start + CHUNK_WINDOWS]
+        mean = w.mean(axis=1)
+        centered = w - mean[:, None]
+        out[:, 0] = mean
+        out[:, 1] = np.sqrt(np.mean(w**2, axis=1))
+        out[:, 2] = np.abs(np.diff(w, axis=1)).sum(axis=1)
+        sign = np.signbit(centered)
+        out[:, 3] = np.count_nonzero(sign[:, 1:] != sign[:, :-1], axis=1)
+        out[:, 4:] = band_power(centered, bands, sampling_rate)
+    return result
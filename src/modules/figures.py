@@ -0,0 +1,120 @@
+import concurrent.futures
+import datetime
+import os
+import sys
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+FIG_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "fig"))
+
+FIG_SIZE = (6.4, 4.8)  # インチ
+FIG_DPI = 100
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def fig_dir(date=None):
+    """図の保存先 fig/<日付>/ を作成して返す."""
+    if date is None:
+        date = datetime.date.today()
+    path = os.path.join(FIG_DIR, date.strftime(DATE_FORMAT))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def decimate_minmax(y, n_bins, x=None):
+    """信号を n_bins 個の区間に分け, 区間ごとの最小値と最大値だけを残す.
+
+    1 ピクセルあたり 1 区間にすれば, 描画しても見た目は変わらない.
+    """
+    y = np.asarray(y)
+    if x is None:
+        x = np.arange(len(y))
+    if len(y) <= 2*n_bins:
+        return x, y
+    edges = np.linspace(0, len(y), n_bins + 1).astype(int)
+    starts = edges[:-1]
+    xs = np.column_stack([x[starts], x[edges[1:] - 1]]).ravel()
+    ys = np.column_stack([
+        np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts),
+    ]).ravel()
+    return xs, ys
+
+
+def envelope_minmax(y, n_bins, x=None):
+    """信号を n_bins 個の区間に分け, 区間ごとの (x, 最小値, 最大値) を返す.
+
+    最小値と最大値の間を塗りつぶして描くと, 折れ線で往復させるよりも
+    描画が速い.
+    """
+    y = np.asarray(y)
+    if x is None:
+        x = np.arange(len(y))
+    if len(y) <= n_bins:
+        return x, y, y
+    starts = np.linspace(0, len(y), n_bins + 1).astype(int)[:-1]
+    return (x[starts], np.minimum.reduceat(y, starts),
+            np.maximum.reduceat(y, starts))
+
+
+class LinePlot:
+    """Agg で PNG に描画する折れ線グラフ.
+
+    pyplot を使わずに図を 1 つだけ作り, 線のデータを差し替えて何枚も
+    保存する. 長い信号は横のピクセル数に合わせて間引く.
+    """
+
+    def __init__(self, n_lines, labels=None, alphas=None, xlabel="",
+                 ylabel="", title="", ylim=None, size=FIG_SIZE, dpi=FIG_DPI):
+        self.fig = Figure(figsize=size, dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(111)
+        self.n_bins = int(size[0] * dpi)
+        self.ylim = ylim
+
+        if labels is None:
+            labels = [None] * n_lines
+        if alphas is None:
+            alphas = [None] * n_lines
+        self.lines = [
+            self.ax.plot([], [], label=label, alpha=alpha)[0]
+            for label, alpha in zip(labels, alphas)]
+
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_title(title)
+        if ylim is not None:
+            self.ax.set_ylim(*ylim)
+        if any(label is not None for label in labels):
+            self.ax.legend()
+
+    def set_data(self, i, y, x=None):
+        """i 番目の線のデータを差し替える."""
+        self.lines[i].set_data(*decimate_minmax(y, self.n_bins, x))
+
+    def set_title(self, title):
+        self.ax.set_title(title)
+
+    def save(self, filename):
+        """表示範囲を合わせて PNG に保存する."""
+        self.ax.relim()
+        self.ax.autoscale_view(scaley=self.ylim is None)
+        self.fig.savefig(filename)
+
+
+def render_parallel(func, jobs, max_workers=None):
+    """jobs の各引数のタプルで func を別プロセスで呼び, 結果を返す."""
+    results = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = {
+            executor.submit(func, *args): i for i, args in enumerate(jobs)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                print(f"ERROR: Could not render: {e}", file=sys.stderr)
+    return results
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+
+
+# rho^-n がこの値を超えないように区間を分けて EMA を計算する
+EMA_MAX_GAIN = 1e150
+
+
+def ema(x, rhos, init=None):
+    """指数移動平均 (EMA) を計算する.
+
+    y[n] = rho*y[n-1] + (1 - rho)*x[n] の漸化式を, 区間ごとに累積和で
+    まとめて解く. rhos に配列を渡すと各 rho の EMA を一度に計算し,
+    (len(rhos), len(x)) の配列を返す. rhos がスカラーなら 1 次元配列を返す.
+
+    init には直前の EMA の値 (rho ごと) を渡す. None の場合は x の先頭の
+    値から計算を始める.
+    """
+    x = np.asarray(x, dtype=float)
+    scalar = np.ndim(rhos) == 0
+    rhos = np.atleast_1d(np.asarray(rhos, dtype=float))
+    y = np.empty((len(rhos), len(x)))
+    if len(x) == 0:
+        return y[0] if scalar else y
+
+    if init is None:
+        prev = np.full(len(rhos), x[0])
+    else:
+        prev = np.broadcast_to(np.asarray(init, dtype=float), rhos.shape)
+
+    # rho = 0 の場合は入力そのもの
+    zero = rhos == 0
+    safe = np.where(zero, 1.0, rhos)[:, None]
+
+    # 区間の長さは rho^-n がオーバーフローしない範囲で決める
+    log_min = math.log(safe.min())
+    if log_min < 0:
+        step = max(1, int(math.log(EMA_MAX_GAIN) / -log_min))
+    else:
+        step = len(x)
+
+    for start in range(0, len(x), step):
+        chunk = x[start:start + step]
+        powers = safe ** np.arange(1, len(chunk) + 1)
+        y_chunk = powers * (
+            prev[:, None] + (1 - safe)*np.cumsum(chunk / powers, axis=1))
+        y[:, start:start + step] = y_chunk
+        prev = y_chunk[:, -1]
+    y[zero] = x
+    return y[0] if scalar else y
+
+
+def rho_for_cutoff(cutoff, sampling_rate):
+    """遮断周波数 (Hz) に対応する EMA の係数 rho を返す."""
+    return math.exp(-2*math.pi*cutoff/sampling_rate)
+
+
+def moving_average(x, n):
+    """直近 n サンプルの移動平均を計算する.
+
+    先頭の n - 1 サンプルは, それまでのサンプルだけで平均する.
+    """
+    x = np.asarray(x, dtype=float)
+    c = np.concatenate([[0.0], np.cumsum(x)])
+    i = np.arange(1, len(x) + 1)
+    lo = np.maximum(i - n, 0)
+    return (c[i] - c[lo]) / (i - lo)
+
+
+def rms_envelope(x, n):
+    """直近 n サンプルの RMS による包絡線を計算する."""
+    x = np.asarray(x, dtype=float)
+    return np.sqrt(np.maximum(moving_average(x**2, n), 0.0))
+
+
+def lowpass_envelope(x, cutoff, sampling_rate, order=2):
+    """整流した信号を低域通過させた包絡線を計算する.
+
+    1 次の低域通過フィルタ (EMA) を order 段重ねる.
+    """
+    y = np.abs(np.asarray(x, dtype=float))
+    rho = rho_for_cutoff(cutoff, sampling_rate)
+    for _ in range(order):
+        y = ema(y, rho)
+    return y
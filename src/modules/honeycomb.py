@@ -1,6 +1,4 @@
-import itertools
 import math
-import os
 import random
 import sys
 import time
@@ -8,6 +6,8 @@ import time
 import numpy as np
 import pygame
 
+from modules.atlas import load_atlas
+
 
 # 画像ラベル
 HC_IMG_BASE = "hc_base.png"
@@ -36,10 +36,8 @@ HC_STATE_INACTIVE = 0
 HC_STATE_ACTIVE = 1
 
 # フィールドの設定
-FIELD_W = 2*5 + 1
-FIELD_H = 2*5 + 1
-
 BASE = 0
+EMPTY = -1  # NumPy 配列で表したフィールドの空きマス
 
 FIELD_TMP = [
     [None, None, None, None, None, None, None, None, None, None, None],
@@ -99,6 +97,17 @@ FIELD_2 = [
 
 FIELDS = [FIELD_1, FIELD_2]
 
+compiled_fields = {}
+
+# フィールド生成の設定
+ORDER_SPIRAL = "spiral"  # FIELD_0 と同じく, 上から反時計回りに内側の環から
+ORDER_ROWS = "rows"  # 上の行から
+ORDER_RANDOM = "random"
+
+# 六角格子の軸座標 (q, r) における方向 (南西, 南, 南東, 北東, 北, 北西)
+HEX_DIRECTIONS = np.array(
+    [[-1, 1], [0, 1], [1, 0], [1, -1], [0, -1], [-1, 0]])
+
 # サーフェイスの設定
 COLORKEY = (200, 200, 200)
 
@@ -122,10 +131,9 @@ class Honeycomb:
     def deactivate(self):
         self.state = HC_STATE_INACTIVE
 
-    def render(self, surface):
-        """ハニカムを描画する."""
+    def update_anim(self, current_time):
+        """アニメーションを進め, 表示する画像のラベルを更新する."""
         if self.state == HC_STATE_INACTIVE:
-            current_time = time.time()
             if current_time - self.anim_last_time > self.anim_duration:
                 self.anim_last_time = current_time
                 self.anim_count = 1 if self.anim_count == 0 else 0
@@ -133,13 +141,62 @@ class Honeycomb:
                     HC_INACTIVE_1, HC_INACTIVE_2][self.anim_count]
         elif self.state == HC_STATE_ACTIVE:
             self.anim_label = self.label
+
+    def render(self, surface):
+        """ハニカムを描画する."""
+        self.update_anim(time.time())
         surface.blit(hc_imgs[self.anim_label], self.pos)
 
 
-def load_hc_imgs(img_dir):
+class HoneycombLayer:
+    """ハニカムを描画した永続的なレイヤ.
+
+    update を呼ぶと, 前回から表示する画像が変わったハニカムだけを描き直し,
+    描き直した領域 (dirty rect) のリストを返す. ハニカムは隣同士で重なる
+    ため, 描き直す領域に掛かるハニカムも元の順序で描き直す.
+    """
+
+    def __init__(self, screen_size, field_info):
+        self.surface = pygame.surface.Surface(screen_size)
+        self.surface.fill(COLORKEY)
+        self.surface.set_colorkey(COLORKEY)
+        self.rect = self.surface.get_rect()
+
+        self.hcs = field_info["hcs"]
+        self.rects = [
+            pygame.Rect(int(hc.pos[0]), int(hc.pos[1]), HC_SIZE, HC_SIZE)
+            for hc in self.hcs]
+        self.overlaps = [rect.collidelistall(self.rects) for rect in self.rects]
+        self.drawn_labels = [None] * len(self.hcs)
+
+    def update(self):
+        """変化したハニカムを描き直し, dirty rect のリストを返す."""
+        current_time = time.time()
+        dirty = []
+        for i, hc in enumerate(self.hcs):
+            hc.update_anim(current_time)
+            if hc.anim_label != self.drawn_labels[i]:
+                dirty.append(i)
+
+        for i in dirty:
+            rect = self.rects[i]
+            self.surface.set_clip(rect)
+            self.surface.fill(COLORKEY, rect)
+            for j in self.overlaps[i]:
+                hc = self.hcs[j]
+                self.surface.blit(hc_imgs[hc.anim_label], hc.pos)
+        self.surface.set_clip(None)
+
+        for i in dirty:
+            self.drawn_labels[i] = self.hcs[i].anim_label
+        return [self.rects[i] for i in dirty]
+
+
+def load_hc_imgs(img_dir, screen_size=(0, 0)):
     """ハニカムの画像をロードする.
 
-    この関数はアプリの初期化段階で呼び出す必要がある.
+    この関数はアプリの初期化段階 (画面の生成後) で呼び出す必要がある.
+    画像は縮小・変換済みのスプライトアトラスとしてまとめて読み込む.
     """
     labels = [
         HC_IMG_BASE,
@@ -150,39 +207,115 @@ def load_hc_imgs(img_dir):
         HC_INACTIVE_1,
         HC_INACTIVE_2
     ]
-    for label in labels:
-        img = pygame.image.load(os.path.join(img_dir, label))
-        img.convert()
-        img = pygame.transform.scale(img, (HC_SIZE, HC_SIZE))
-        hc_imgs[label] = img
-
-
-def calc_hc_pos(field_f, target, screen_center):
-    """フィールドの位置から座標を計算する."""
-    try:
-        index = field_f.index(target)
-    except ValueError:
-        print(f"ERROR: Could not find '{target}' from the field.",
+    atlas = load_atlas("hc", img_dir, labels, HC_SIZE, screen_size)
+    hc_imgs.update(atlas.frames)
+
+
+def compile_field(field):
+    """フィールドを配列の形式に変換し, 各ハニカムの座標をまとめて計算する.
+
+    field はリストの 2 次元リスト (空きは None) か NumPy 配列 (空きは
+    EMPTY) で与える. 返す dict は以下を持つ.
+
+    - "labels": セルの番号の 2 次元配列 (空きは EMPTY)
+    - "cells": ハニカムの番号から (行, 列) を引く配列
+    - "offsets": 画面の中心を原点とした各ハニカムの描画位置
+
+    結果はフィールドの内容ごとにキャッシュし, ステージや画面サイズを
+    またいで再利用する.
+    """
+    if isinstance(field, np.ndarray):
+        labels = field.astype(int)
+    else:
+        labels = np.array(
+            [[EMPTY if i is None else i for i in row] for row in field])
+    key = (labels.shape, labels.tobytes())
+    if key in compiled_fields:
+        return compiled_fields[key]
+
+    # 番号 -> (行, 列) の逆引き
+    num_of_hcs = int(labels.max())
+    rows, cols = np.nonzero(labels != EMPTY)
+    cells = np.full((num_of_hcs + 1, 2), -1)
+    cells[labels[rows, cols]] = np.column_stack([rows, cols])
+    missing = np.flatnonzero(cells[:, 0] < 0)
+    if len(missing) > 0:
+        print(f"ERROR: Could not find '{missing[0]}' from the field.",
               file=sys.stderr)
         sys.exit(1)
-    row = index//FIELD_W - FIELD_W//2
-    col = index%FIELD_W - FIELD_H//2
+
+    # 六角格子上の座標 (奇数列は半マス下にずらす)
+    h, w = labels.shape
+    row = cells[:, 0] - h//2
+    col = cells[:, 1] - w//2
     x = col * HC_DIST_HOR
     y = (row + 1/2*(col % 2)) * HC_DIST_VER
-    return np.array([x, y]) + screen_center + HC_OFFSET
+    offsets = np.column_stack([x, y]) + HC_OFFSET
+
+    layout = {
+        "labels": labels,
+        "cells": cells,
+        "offsets": offsets,
+        "num_of_hcs": num_of_hcs,
+    }
+    compiled_fields[key] = layout
+    return layout
+
+
+def spiral_hex_cells(radius):
+    """中心から外側へ渦巻き状にたどったセルの (行, 列) を返す.
+
+    各環は真上のセルから始めて反時計回りにたどる (FIELD_0 と同じ順序).
+    行と列は中心を原点とし, 奇数列が半マス下にずれた配置で表す.
+    """
+    axial = [np.zeros((1, 2), dtype=int)]
+    for k in range(1, radius + 1):
+        start = np.array([0, -k])
+        steps = np.repeat(HEX_DIRECTIONS, k, axis=0)
+        ring = start + np.cumsum(steps, axis=0) - steps
+        axial.append(ring)
+    axial = np.concatenate(axial)
+    q, r = axial[:, 0], axial[:, 1]
+    return np.column_stack([r + (q - (q & 1))//2, q])
+
+
+def generate_field(radius, order=ORDER_SPIRAL, seed=None):
+    """半径 radius の六角形のフィールドを生成する.
+
+    order には ORDER_* のいずれかか, 渦巻き順の (行, 列) の配列を受け取って
+    並べ替えの添字を返す関数を渡す. 中心は常に BASE になる.
+    返すフィールドは NumPy 配列で, 空きマスは EMPTY で表す.
+    """
+    cells = spiral_hex_cells(radius)
+    if callable(order):
+        indices = np.asarray(order(cells[1:])) + 1
+    elif order == ORDER_SPIRAL:
+        indices = np.arange(1, len(cells))
+    elif order == ORDER_ROWS:
+        indices = np.lexsort((cells[1:, 1], cells[1:, 0])) + 1
+    elif order == ORDER_RANDOM:
+        indices = np.random.default_rng(seed).permutation(len(cells) - 1) + 1
+    else:
+        raise ValueError(f"Unknown field order '{order}'.")
+
+    h = 2*np.abs(cells[:, 0]).max() + 1
+    w = 2*radius + 1
+    field = np.full((h, w), EMPTY)
+    field[cells[0, 0] + h//2, cells[0, 1] + w//2] = BASE
+    ordered = cells[indices]
+    field[ordered[:, 0] + h//2, ordered[:, 1] + w//2] = np.arange(
+        1, len(cells))
+    return field
 
 
 def make_field_info(field, screen_center):
     """フィールドの情報を生成する."""
     field_info = {}
-    field_f = list(itertools.chain.from_iterable(field))
-    num_of_hcs = max([i for i in field_f if isinstance(i, int)])
-    field_info["num_of_hcs"] = num_of_hcs
-    pos_list = [calc_hc_pos(field_f, BASE, screen_center)]
+    layout = compile_field(field)
+    field_info["num_of_hcs"] = layout["num_of_hcs"]
+    pos_list = list(layout["offsets"] + screen_center)
     hcs = [Honeycomb(pos_list[0], HC_IMG_BASE)]
-    for i in range(1, num_of_hcs + 1):
-        pos = calc_hc_pos(field_f, i, screen_center)
-        pos_list.append(pos)
+    for pos in pos_list[1:]:
         hcs.append(Honeycomb(pos, HC_IMG_1))
     field_info["pos_list"] = pos_list
     field_info["hcs"] = hcs
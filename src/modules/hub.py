@@ -0,0 +1,161 @@
+import json
+import math
+import sys
+import threading
+import time
+
+from modules.buffer import RingBuffer
+from modules.device import (
+    MAX_BLOCK_DATA_LEN,
+    get_device,
+    sample_block,
+    start_device,
+)
+from modules.pipeline import PIPE_CAPACITY, PIPE_FIELDS, SamplePipe
+from modules.spectral import SpectralDetector
+
+
+GET_DEVICE_RETRIES = 3
+GET_DEVICE_INTERVAL = 1.0  # s
+
+
+class Station:
+    """1 台のデバイスと, その読み出し用スレッド・バッファ・判定基準.
+
+    読み出し用スレッドはデバイスから読んだブロックを自分のバッファと
+    パイプに書き込む. criteria はこのデバイス (プレイヤー) 専用の
+    キャリブレーションの結果で, facial の関数に渡して使う.
+    """
+
+    def __init__(self, name, device, buffer_len=MAX_BLOCK_DATA_LEN,
+                 pipe_capacity=PIPE_CAPACITY, fields=PIPE_FIELDS):
+        self.name = name
+        self.device = device
+        self.accs = RingBuffer(buffer_len)
+        self.emgs = RingBuffer(buffer_len)
+        self.emgs_ema = RingBuffer(buffer_len)
+        self.features = {}
+        self.pipe = SamplePipe(pipe_capacity, fields)
+        self.detector = SpectralDetector()
+        self.criteria = {}
+        self.error = None
+        self.thread = None
+
+    def run(self, stop_event):
+        """読み出し用スレッドの関数."""
+        while not stop_event.is_set():
+            try:
+                sample_block(
+                    self.device, self.accs, self.emgs, self.emgs_ema,
+                    self.features, self.detector)
+            except Exception as e:
+                self.error = e
+                print(f"ERROR: Could not read from '{self.name}': {e}",
+                      file=sys.stderr)
+                break
+            self.pipe.publish(self.features)
+
+
+class DeviceHub:
+    """複数のデバイスをまとめて読み出す.
+
+    デバイスごとに読み出し用スレッドを 1 つ動かす. ゲームのループからは
+    aligned で, 全デバイスに共通する時刻にそろえた値を取得できる.
+    """
+
+    def __init__(self, stations):
+        self.stations = stations
+        self.stop_event = threading.Event()
+
+    def __getitem__(self, name):
+        for station in self.stations:
+            if station.name == name:
+                return station
+        raise KeyError(name)
+
+    def __len__(self):
+        return len(self.stations)
+
+    def start(self):
+        for station in self.stations:
+            station.thread = threading.Thread(
+                target=station.run, args=[self.stop_event], daemon=True)
+            station.thread.start()
+
+    def stop(self):
+        """読み出し用スレッドを止め, デバイスを閉じる."""
+        self.stop_event.set()
+        for station in self.stations:
+            if station.thread is not None:
+                station.thread.join()
+            station.device.stop()
+            station.device.close()
+
+    def ready(self):
+        """全デバイスから 1 ブロック以上受け取ったかどうか."""
+        return all(station.pipe.count > 0 for station in self.stations)
+
+    def aligned(self, field):
+        """全デバイスにデータがある最新の時刻と, その時刻における各デバイス
+        の値 (その時刻以前で最新のブロック) のリストを返す.
+
+        まだデータがないデバイスがある場合は IndexError.
+        """
+        common_time = min(
+            station.pipe.at(field)[1] for station in self.stations)
+        values = [
+            station.pipe.at(field, common_time)[0]
+            for station in self.stations]
+        return common_time, values
+
+    def ages(self):
+        """各デバイスの最新のブロックの経過時間 (s)."""
+        now = time.monotonic()
+        return [
+            now - station.pipe.at("ema")[1] if station.pipe.count > 0
+            else math.inf
+            for station in self.stations]
+
+
+def load_config(filename):
+    """デバイスの設定ファイル (JSON) を読み込む.
+
+    形式: {"devices": [{"name": "player1", "address": "98:D3:..."},
+    {"name": "player2", "address": "replay:*_v1_smile.csv"}]}
+    """
+    with open(filename) as f:
+        config = json.load(f)
+    return config["devices"]
+
+
+def entries_from_addresses(addresses):
+    """アドレス (MAC アドレスか "replay:...") のリストから, load_config と
+    同じ形式のデバイスのリストを作る. 名前は player1, player2, ..."""
+    return [
+        {"name": f"player{i + 1}", "address": address}
+        for i, address in enumerate(addresses)]
+
+
+def open_hub(entries):
+    """全デバイス ({"name", "address"} のリスト) と接続して計測を始め,
+    DeviceHub を返す.
+
+    接続できないデバイスがある場合は None を返す.
+    """
+    stations = []
+    for entry in entries:
+        device = None
+        for _ in range(GET_DEVICE_RETRIES):
+            device = get_device(entry["address"])
+            if device is not None:
+                break
+            time.sleep(GET_DEVICE_INTERVAL)
+        if device is None:
+            print(f"ERROR: Could not get the device '{entry['name']}'.",
+                  file=sys.stderr)
+            for station in stations:
+                station.device.close()
+            return None
+        start_device(device)
+        stations.append(Station(entry["name"], device))
+    return DeviceHub(stations)
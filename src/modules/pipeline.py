@@ -0,0 +1,117 @@
+import math
+import time
+
+import numpy as np
+
+
+# サンプリング側からゲームのループへ受け渡すブロックの特徴量
+# (sample_block が features に格納する値)
+PIPE_CAPACITY = 64  # ブロック
+PIPE_FIELDS = ["ema", "last", "mean", "rms", "power", "ratio"]
+
+
+class SamplePipe:
+    """サンプリングスレッドから他のスレッドへブロックの特徴量を渡すパイプ.
+
+    書き込みは 1 スレッドで行う. 直近 capacity ブロック分の特徴量と,
+    ブロックを受け取った時刻 (time.monotonic) を固定長の配列に保持する.
+
+    lock_seq は書き込み中に奇数になるシーケンス番号 (seqlock) で, 読み出し
+    側はロックを取らずに, 書き込みと競合していない値を読み出せる.
+    count はこれまでに書き込んだブロックの総数.
+    """
+
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.fields = fields
+        self.values = np.zeros((capacity, len(fields)))
+        self.times = np.zeros(capacity)
+        self.count = 0
+        self.lock_seq = 0
+
+    def publish(self, features, timestamp=None):
+        """ブロックの特徴量 (dict) を書き込む."""
+        if timestamp is None:
+            timestamp = features.get("time", time.monotonic())
+        i = self.count % self.capacity
+        self.lock_seq += 1
+        self.values[i] = [features[field] for field in self.fields]
+        self.times[i] = timestamp
+        self.count += 1
+        self.lock_seq += 1
+
+    def latest(self, field):
+        """最新のブロックの値と, その経過時間 (s) を返す."""
+        col = self.fields.index(field)
+        while True:
+            seq = self.lock_seq
+            if seq % 2 == 1:
+                time.sleep(0)
+                continue
+            count = self.count
+            if count == 0:
+                raise IndexError("latest() from empty pipe")
+            i = (count - 1) % self.capacity
+            value = self.values[i, col].item()
+            timestamp = self.times[i].item()
+            if seq == self.lock_seq:
+                return value, time.monotonic() - timestamp
+
+    def at(self, field, timestamp=math.inf):
+        """時刻 timestamp 以前で最新のブロックの値と, その時刻を返す.
+
+        保持している最も古いブロックより前の時刻の場合は, 最も古い
+        ブロックを返す.
+        """
+        col = self.fields.index(field)
+        while True:
+            seq = self.lock_seq
+            if seq % 2 == 1:
+                time.sleep(0)
+                continue
+            count = self.count
+            if count == 0:
+                raise IndexError("at() from empty pipe")
+            n = min(count, self.capacity)
+            indices = np.arange(count - n, count) % self.capacity
+            times = self.times[indices]
+            k = max(np.searchsorted(times, timestamp, side="right") - 1, 0)
+            value = self.values[indices[k], col].item()
+            block_time = times[k].item()
+            if seq == self.lock_seq:
+                return value, block_time
+
+    def reader(self):
+        """これから書き込まれるブロックを順に読み出す PipeReader を返す."""
+        return PipeReader(self)
+
+
+class PipeReader:
+    """SamplePipe の読み出し側.
+
+    まだ読み出していないブロックを順に取り出す. 読み出しが遅れて上書き
+    されたブロックは読み飛ばし, その数を drops に数える.
+    """
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.next = pipe.count
+        self.drops = 0
+
+    def read(self):
+        """新しいブロックの特徴量 (ブロック数, 特徴量数) と時刻を返す."""
+        pipe = self.pipe
+        end = pipe.count
+        start = max(self.next, end - pipe.capacity)
+        indices = np.arange(start, end) % pipe.capacity
+        values = pipe.values[indices]
+        times = pipe.times[indices]
+
+        # コピー中に上書きされた (されうる) ブロックを除く
+        oldest = min(max(start, pipe.count + 1 - pipe.capacity), end)
+        values = values[oldest - start:]
+        times = times[oldest - start:]
+
+        self.drops += oldest - self.next
+        self.next = end
+        return values, times
@@ -0,0 +1,196 @@
+import csv
+import datetime
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+
+# 記録ファイルの形式
+# [マジック (8 バイト)] [ヘッダ長 (uint32)] [JSON ヘッダ] [サンプル (行優先)]
+# サンプルは (サンプル数, チャンネル数) の配列をそのまま書き込むので,
+# 末尾への追記と, np.memmap による読み出しができる.
+RECORDING_EXT = ".emgrec"
+RECORDING_MAGIC = b"EMGREC1\n"
+
+RECORDING_DTYPE = "<i2"  # BITalino の生の値 (10 bit)
+RECORDING_ALIGN = 64  # サンプルの開始位置の境界 (バイト)
+
+RECORDING_VERSION = 1
+
+WRITE_BUFFER_SIZE = 1 << 20  # バイト
+
+# 既存の CSV の既定値
+SAMPLING_RATE = 1000  # Hz
+
+BITS = 10
+VCC = 3.3
+GAIN = 1009
+
+DT_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+
+def make_header(label, channels, pins, sampling_rate=SAMPLING_RATE,
+                bits=BITS, vcc=VCC, gain=GAIN, start_time=None):
+    """記録ファイルのヘッダを生成する.
+
+    channels はチャンネルの名前 ("acc", "emg" など), pins はそのピン番号.
+    """
+    if start_time is None:
+        start_time = datetime.datetime.now()
+    return {
+        "version": RECORDING_VERSION,
+        "label": label,
+        "channels": list(channels),
+        "pins": list(pins),
+        "sampling_rate": sampling_rate,
+        "bits": bits,
+        "vcc": vcc,
+        "gain": gain,
+        "start_time": start_time.isoformat(),
+        "dtype": RECORDING_DTYPE,
+    }
+
+
+def read_header(f):
+    """ファイルの先頭からヘッダを読み込み, ヘッダとサンプルの開始位置を返す."""
+    if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+        raise ValueError("Not a recording file.")
+    (length,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(length).decode("utf-8"))
+    return header, len(RECORDING_MAGIC) + 4 + length
+
+
+class RecordingWriter:
+    """記録ファイルへサンプルを追記する.
+
+    既存のファイルを開いた場合は, その末尾に追記する (ヘッダは変えない).
+    書き込み中に中断されて末尾に不完全な行が残っている場合は, それを
+    切り捨ててから追記する (そのままだと以降の行がずれる).
+    """
+
+    def __init__(self, filename, header=None):
+        self.filename = filename
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, "rb") as f:
+                self.header, self.offset = read_header(f)
+        else:
+            self.header = header
+            self.offset = write_header(filename, header)
+        self.n_channels = len(self.header["channels"])
+        self.dtype = np.dtype(self.header["dtype"])
+        row_bytes = self.dtype.itemsize * self.n_channels
+        self.n_samples = (os.path.getsize(filename) - self.offset) // row_bytes
+        size = self.offset + self.n_samples * row_bytes
+        if os.path.getsize(filename) != size:
+            os.truncate(filename, size)
+        self.f = open(filename, "ab", buffering=WRITE_BUFFER_SIZE)
+
+    def append(self, block):
+        """(サンプル数, チャンネル数) のブロックを追記する."""
+        block = np.asarray(block).astype(self.dtype, copy=False)
+        block = block.reshape(-1, self.n_channels)
+        self.f.write(np.ascontiguousarray(block).tobytes())
+        self.n_samples += len(block)
+
+    def flush(self, sync=False):
+        """バッファを書き出す. sync が True の場合はディスクまで同期する."""
+        self.f.flush()
+        if sync:
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_header(filename, header):
+    """ヘッダだけのファイルを作成し, サンプルの開始位置を返す."""
+    body = json.dumps(header).encode("utf-8")
+    offset = len(RECORDING_MAGIC) + 4 + len(body)
+    padding = -offset % RECORDING_ALIGN
+    body += b" " * padding
+    with open(filename, "wb") as f:
+        f.write(RECORDING_MAGIC)
+        f.write(struct.pack("<I", len(body)))
+        f.write(body)
+    return offset + padding
+
+
+def open_recording(filename):
+    """記録ファイルを開き, ヘッダと (サンプル数, チャンネル数) の
+    読み取り専用の memmap を返す.
+
+    書き込み中のファイルでも, 開いた時点までの完全な行だけを返す.
+    """
+    with open(filename, "rb") as f:
+        header, offset = read_header(f)
+    dtype = np.dtype(header["dtype"])
+    n_channels = len(header["channels"])
+    n_samples = (
+        (os.path.getsize(filename) - offset) // (dtype.itemsize * n_channels))
+    if n_samples == 0:
+        return header, np.zeros((0, n_channels), dtype=dtype)
+    data = np.memmap(
+        filename, dtype=dtype, mode="r", offset=offset,
+        shape=(n_samples, n_channels))
+    return header, data
+
+
+def read_csv_signal(filename):
+    """1 行目がラベル, 2 行目以降が値の CSV を読み込む."""
+    with open(filename, newline="") as f:
+        label = next(csv.reader(f))[0]
+        data = np.loadtxt(f, ndmin=1)
+    return label, data
+
+
+def read_signal(filename, channel=-1):
+    """記録ファイルか CSV から, ラベルと 1 チャンネル分の信号を読み込む.
+
+    記録ファイルの場合, channel はチャンネルの番号か名前で指定する.
+    """
+    if not str(filename).endswith(RECORDING_EXT):
+        return read_csv_signal(filename)
+    header, data = open_recording(filename)
+    if isinstance(channel, str):
+        channel = header["channels"].index(channel)
+    return header["label"], data[:, channel]
+
+
+def parse_filename(filename):
+    """data/ のファイル名 (日時_バージョン_モード) から日時とモードを取り出す."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    start_time = None
+    try:
+        start_time = datetime.datetime.strptime(stem[:19], DT_FORMAT)
+    except ValueError:
+        pass
+    mode = stem[20:].split("_", 1)[-1] if len(stem) > 20 else ""
+    return start_time, mode
+
+
+def convert_csv(filename, out_filename=None):
+    """既存の CSV (1 チャンネル) を記録ファイルに変換する."""
+    if out_filename is None:
+        out_filename = os.path.splitext(filename)[0] + RECORDING_EXT
+    label, data = read_csv_signal(filename)
+    start_time, _ = parse_filename(filename)
+    if start_time is None:
+        start_time = datetime.datetime.fromtimestamp(
+            os.path.getmtime(filename))
+    header = make_header(label, [label], [None], start_time=start_time)
+    if os.path.exists(out_filename):
+        os.remove(out_filename)
+    with RecordingWriter(out_filename, header) as writer:
+        writer.append(data.reshape(-1, 1))
+    print(f"{filename} -> {out_filename} ({len(data)} samples)",
+          file=sys.stderr)
+    return out_filename
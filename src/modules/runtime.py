@@ -0,0 +1,59 @@
+import asyncio
+import concurrent.futures
+
+import pygame
+import pygame.locals
+
+
+EVENT_POLL_INTERVAL = 1 / 30  # s (1 フレーム程度)
+WATCH_INTERVAL = 0.1  # s
+
+
+async def repeat_in_executor(func, *args):
+    """func(*args) を専用のスレッドで繰り返し呼ぶ (デバイスの読み出し用).
+
+    読み出しは常に同じスレッドで, 1 回ずつ順に行う. キャンセルされた
+    場合は, 実行中の呼び出しが終わるのを待ってから戻る. func の例外は
+    そのまま送出する.
+    """
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        while True:
+            await loop.run_in_executor(executor, func, *args)
+    finally:
+        executor.shutdown(wait=True)
+
+
+async def pump_events(interval=EVENT_POLL_INTERVAL):
+    """pygame のイベントを interval ごとに処理し, QUIT で戻る."""
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.locals.QUIT:
+                return
+        await asyncio.sleep(interval)
+
+
+async def wait_until(predicate, interval=WATCH_INTERVAL):
+    """predicate() が真になるまで, interval ごとに確認して待つ."""
+    while not predicate():
+        await asyncio.sleep(interval)
+
+
+async def run_until_first(*coros):
+    """コルーチンをタスクとして並行に動かし, どれかが終わったら残りを
+    キャンセルして, その終了を待つ.
+
+    ゲームの終了, QUIT, 読み出しの失敗のいずれでも全体を止めるのに使う.
+    先に終わったタスクが例外で終わった場合は, その例外を送出する.
+    """
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    try:
+        done, _ = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in done:
+        task.result()
@@ -0,0 +1,73 @@
+import multiprocessing
+import sys
+
+from modules.device import get_device, sample_block, start_device
+from modules.shared import SharedRingBuffer, SharedSamplePipe
+from modules.spectral import SpectralDetector
+
+
+JOIN_TIMEOUT = 3.0  # s (これを過ぎても終わらない場合は強制終了する)
+
+
+def sample_p_func(mac_address, accs, emgs, emgs_ema, pipe, stop_event):
+    """サンプリング用プロセスの関数.
+
+    デバイスとの接続はこのプロセスの中で行う.
+    """
+    device = get_device(mac_address)
+    if device is None:
+        print("ERROR: Could not get the device.", file=sys.stderr)
+        stop_event.set()
+        return
+    start_device(device)
+    features = {}
+    detector = SpectralDetector()
+    try:
+        while not stop_event.is_set():
+            sample_block(device, accs, emgs, emgs_ema, features, detector)
+            pipe.publish(features)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.stop()
+        device.close()
+        for shared in [accs, emgs, emgs_ema, pipe]:
+            shared.close()
+
+
+class SamplerProcess:
+    """別プロセスでデバイスを読み出し, 共有メモリに書き込む.
+
+    accs, emgs, emgs_ema (SharedRingBuffer) と pipe (SharedSamplePipe) は
+    このプロセス (ゲーム側) から, コピーなしで読み出せる. stop_event
+    (multiprocessing.Event) をセットするとサンプリングを終える.
+    """
+
+    def __init__(self, mac_address, buffer_len, pipe_capacity, fields,
+                 stop_event=None):
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = (
+            context.Event() if stop_event is None else stop_event)
+        self.accs = SharedRingBuffer(buffer_len)
+        self.emgs = SharedRingBuffer(buffer_len)
+        self.emgs_ema = SharedRingBuffer(buffer_len)
+        self.pipe = SharedSamplePipe(pipe_capacity, fields)
+        self.process = context.Process(
+            target=sample_p_func,
+            args=[mac_address, self.accs, self.emgs, self.emgs_ema,
+                  self.pipe, self.stop_event],
+            daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def stop(self):
+        """プロセスを終わらせ, 共有メモリを解放する."""
+        self.stop_event.set()
+        self.process.join(JOIN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        for shared in [self.accs, self.emgs, self.emgs_ema, self.pipe]:
+            shared.close()
+            shared.unlink()
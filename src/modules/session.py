@@ -0,0 +1,82 @@
+import csv
+import gzip
+import os
+import time
+
+import numpy as np
+
+from modules.writer import BackgroundWriter
+
+
+# 1 セッション (キャリブレーションからプレイの終了まで) のログ
+# 列は時刻 (セッション開始からの秒), フェーズ名 (baseline, smiling,
+# stage1 など), ブロックの値. gzip は追記すると新しいメンバーになるので,
+# 途中で書き込みが止まっても, それまでの行は読み出せる.
+SESSION_EXT = ".csv.gz"
+SESSION_COLUMNS = ["time", "phase", "img", "mean"]
+
+
+class SessionLog:
+    """セッションのログを gzip の CSV に書き込む.
+
+    log はキューに入れるだけで, 書き込みは BackgroundWriter のスレッドが
+    まとめて行う. 呼び出し側 (ゲームのループ) はディスクの I/O を待たない.
+    """
+
+    def __init__(self, filename, columns=SESSION_COLUMNS):
+        self.filename = filename
+        self.start_time = time.monotonic()
+        new = not os.path.exists(filename)
+        self.f = gzip.open(filename, "at", newline="")
+        self.csv = csv.writer(self.f)
+        if new:
+            self.csv.writerow(columns)
+        self.writer = BackgroundWriter(self.write_rows, self.flush)
+        self.writer.start()
+
+    def log(self, phase, times, values):
+        """ブロックの時刻 (time.monotonic) と値 (ブロック数, 列数) を記録する."""
+        if len(times) > 0:
+            self.writer.put((phase, np.asarray(times) - self.start_time,
+                             np.array(values)))
+
+    def write_rows(self, items):
+        """書き込み用スレッドで呼ばれる."""
+        for phase, times, values in items:
+            self.csv.writerows(
+                [f"{t:.3f}", phase] + [f"{v:.6g}" for v in row]
+                for t, row in zip(times, values))
+
+    def flush(self, sync=False):
+        self.f.flush()
+        if sync:
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        try:
+            self.writer.stop()
+        finally:
+            self.f.close()
+            self.writer.report()
+
+
+def read_session(filename):
+    """セッションのログを読み込み, フェーズごとの (時刻, 値) を返す.
+
+    書き込み中に終了したファイルは, 読み出せたところまでを返す.
+    """
+    phases = {}
+    with gzip.open(filename, "rt", newline="") as f:
+        reader = csv.reader(f)
+        try:
+            next(reader)
+            for row in reader:
+                phases.setdefault(row[1], []).append(
+                    [float(row[0])] + [float(v) for v in row[2:]])
+        except (EOFError, StopIteration):
+            pass
+    result = {}
+    for phase, rows in phases.items():
+        rows = np.array(rows)
+        result[phase] = (rows[:, 0], rows[:, 1:])
+    return result
@@ -0,0 +1,139 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from modules.buffer import RingBuffer
+from modules.pipeline import SamplePipe
+
+
+# 共有メモリの先頭に置く管理情報 (int64 の配列) の大きさ (バイト)
+HEADER_SIZE = 64
+
+
+def open_shared_memory(size, name=None):
+    """共有メモリを作成する. name を指定した場合は既存のものに接続する."""
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=size)
+    return shared_memory.SharedMemory(name=name)
+
+
+def close_shared_memory(shm):
+    """共有メモリとの接続を閉じる.
+
+    まだ参照されているビューがある場合は閉じずに, GC に任せる.
+    """
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+
+class SharedRingBuffer(RingBuffer):
+    """共有メモリ上の RingBuffer.
+
+    データと管理情報 (seq, 先頭位置, 個数) をすべて共有メモリに置くので,
+    別プロセスに渡すと (pickle すると) 同じ共有メモリに接続し, 書き込み
+    側と読み出し側が別のプロセスでもコピーなしで読み出せる.
+    作成したプロセスが最後に unlink する.
+    """
+
+    def __init__(self, capacity, dtype=float, name=None):
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.shm = open_shared_memory(
+            HEADER_SIZE + 2*capacity*self.dtype.itemsize, name)
+        self._header = np.ndarray(3, dtype=np.int64, buffer=self.shm.buf)
+        self._data = np.ndarray(
+            2*capacity, dtype=self.dtype, buffer=self.shm.buf,
+            offset=HEADER_SIZE)
+        if name is None:
+            self._header[:] = 0
+            self._data[:] = 0
+
+    def __reduce__(self):
+        return (type(self), (self.capacity, self.dtype.str, self.shm.name))
+
+    @property
+    def seq(self):
+        return int(self._header[0])
+
+    @seq.setter
+    def seq(self, value):
+        self._header[0] = value
+
+    @property
+    def _head(self):
+        return int(self._header[1])
+
+    @_head.setter
+    def _head(self, value):
+        self._header[1] = value
+
+    @property
+    def _count(self):
+        return int(self._header[2])
+
+    @_count.setter
+    def _count(self, value):
+        self._header[2] = value
+
+    def close(self):
+        """共有メモリとの接続を閉じる (以降は使えない)."""
+        del self._header, self._data
+        close_shared_memory(self.shm)
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedSamplePipe(SamplePipe):
+    """共有メモリ上の SamplePipe.
+
+    SharedRingBuffer と同じく, 別プロセスに渡すと同じ共有メモリに接続する.
+    書き込みは 1 プロセス (の 1 スレッド) だけが行う.
+    """
+
+    def __init__(self, capacity, fields, name=None):
+        self.capacity = capacity
+        self.fields = list(fields)
+        n_fields = len(self.fields)
+        self.shm = open_shared_memory(
+            HEADER_SIZE + capacity*(n_fields + 1)*8, name)
+        self._header = np.ndarray(2, dtype=np.int64, buffer=self.shm.buf)
+        self.values = np.ndarray(
+            (capacity, n_fields), dtype=float, buffer=self.shm.buf,
+            offset=HEADER_SIZE)
+        self.times = np.ndarray(
+            capacity, dtype=float, buffer=self.shm.buf,
+            offset=HEADER_SIZE + capacity*n_fields*8)
+        if name is None:
+            self._header[:] = 0
+            self.values[:] = 0
+            self.times[:] = 0
+
+    def __reduce__(self):
+        return (type(self), (self.capacity, self.fields, self.shm.name))
+
+    @property
+    def count(self):
+        return int(self._header[0])
+
+    @count.setter
+    def count(self, value):
+        self._header[0] = value
+
+    @property
+    def lock_seq(self):
+        return int(self._header[1])
+
+    @lock_seq.setter
+    def lock_seq(self, value):
+        self._header[1] = value
+
+    def close(self):
+        """共有メモリとの接続を閉じる (以降は使えない)."""
+        del self._header, self.values, self.times
+        close_shared_memory(self.shm)
+
+    def unlink(self):
+        self.shm.unlink()
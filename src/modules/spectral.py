@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+
+
+SAMPLING_RATE = 1000  # Hz
+
+# Welch 法の設定 (100 サンプルの区間を 50 サンプルずつずらし, 直近 6 区間
+# = 350 ms のパワースペクトルを平均する)
+SEGMENT_SIZE = 100
+SEGMENT_HOP = 50
+N_SEGMENTS = 6
+
+# 表情筋の EMG の帯域 (Hz). 首の動きや眉の上げ下げによるノイズは
+# ほとんどが 20 Hz 未満に集中する.
+EMG_BAND = (20, 250)
+
+RATIO_THD = 0.5  # EMG の帯域のパワーが全体に占める割合の閾値
+
+
+class SpectralDetector:
+    """EMG の帯域パワーを Welch 法で逐次推定する.
+
+    update にブロックを渡すたびに, 新しく揃った区間だけ FFT してパワー
+    スペクトルの履歴を更新し, 直近 n_segments 区間の平均から EMG の帯域
+    のパワー (mV^2) と, それが全体に占める割合を返す.
+    """
+
+    def __init__(self, segment_size=SEGMENT_SIZE, hop=SEGMENT_HOP,
+                 n_segments=N_SEGMENTS, band=EMG_BAND,
+                 sampling_rate=SAMPLING_RATE):
+        self.segment_size = segment_size
+        self.hop = hop
+        self.taper = np.hanning(segment_size)
+        self.scale = 2 / (segment_size * np.sum(self.taper**2))
+        freqs = np.fft.rfftfreq(segment_size, 1 / sampling_rate)
+        self.band = (freqs >= band[0]) & (freqs < band[1])
+
+        self.spectra = np.zeros((n_segments, len(freqs)))
+        self.n_spectra = 0
+        self.pending = np.zeros(0)
+        self.power = 0.0
+        self.ratio = 0.0
+
+    def update(self, block):
+        """ブロック (mV) を追加し, (帯域のパワー, 割合) を返す."""
+        pending = np.concatenate([self.pending, block])
+        start = 0
+        while start + self.segment_size <= len(pending):
+            segment = pending[start:start + self.segment_size]
+            segment = (segment - segment.mean()) * self.taper
+            i = self.n_spectra % len(self.spectra)
+            self.spectra[i] = np.abs(np.fft.rfft(segment))**2 * self.scale
+            self.n_spectra += 1
+            start += self.hop
+        self.pending = pending[start:]
+
+        n = min(self.n_spectra, len(self.spectra))
+        if n > 0:
+            spectrum = self.spectra[:n].mean(axis=0)
+            total = spectrum.sum()
+            self.power = float(spectrum[self.band].sum())
+            self.ratio = float(self.power / total) if total > 0 else 0.0
+        return self.power, self.ratio
+
+
+def power_threshold(level):
+    """整流した EMG の平均 (EMA) の閾値を, パワーの閾値に換算する.
+
+    正規分布に従う信号では RMS = 平均絶対値 * sqrt(pi/2) となる.
+    """
+    return level**2 * math.pi / 2
+
+
+def is_smile(power, ratio, power_thd, ratio_thd=RATIO_THD):
+    """帯域のパワーと割合から笑顔かどうかを判定する."""
+    return power > power_thd and ratio > ratio_thd
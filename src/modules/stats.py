@@ -0,0 +1,147 @@
+import math
+
+
+Z_95 = 1.96  # 95 % 信頼区間
+
+
+class RunningStats:
+    """平均と分散を 1 値ずつ逐次計算する (Welford 法).
+
+    half_life (値の個数) を指定すると, 古い値ほど重みを指数的に小さくする.
+    n_eff は重みから求めた有効なサンプル数.
+    """
+
+    def __init__(self, half_life=None):
+        self.decay = 0.5 ** (1/half_life) if half_life else 1.0
+        self.count = 0
+        self.weight = 0.0
+        self.weight2 = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, x):
+        self.weight *= self.decay
+        self.weight2 *= self.decay**2
+        self.m2 *= self.decay
+
+        self.count += 1
+        self.weight += 1.0
+        self.weight2 += 1.0
+        delta = x - self.mean
+        self.mean += delta / self.weight
+        self.m2 += delta * (x - self.mean)
+
+    def extend(self, values):
+        for x in values:
+            self.push(float(x))
+
+    @property
+    def n_eff(self):
+        return self.weight**2 / self.weight2 if self.weight2 > 0 else 0.0
+
+    @property
+    def variance(self):
+        """不偏分散."""
+        n_eff = self.n_eff
+        if n_eff <= 1:
+            return 0.0
+        return self.m2 / self.weight * n_eff / (n_eff - 1)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def ci(self, z=Z_95):
+        """平均の信頼区間の半幅."""
+        if self.n_eff <= 1:
+            return math.inf
+        return z * self.std / math.sqrt(self.n_eff)
+
+
+class P2Quantile:
+    """分位点を 5 個のマーカーだけで逐次推定する (P² 法)."""
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.desired = [1.0, 1 + 2*p, 1 + 4*p, 3 + 2*p, 5.0]
+        self.increments = [0.0, p/2, p, (1 + p)/2, 1.0]
+
+    def push(self, x):
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # x が入る区間を探し, マーカーの位置を更新する
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(1, 5) if x < q[i]) - 1
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # 中間のマーカーを理想の位置に近づける
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (
+                    d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                h = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i])
+                    / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1])
+                    / (n[i] - n[i - 1]))
+                if not q[i - 1] < h < q[i + 1]:
+                    h = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = h
+                n[i] += d
+
+    def value(self):
+        q = self.heights
+        if len(q) == 0:
+            raise IndexError("value() from empty sketch")
+        if len(q) < 5:
+            return q[round(self.p * (len(q) - 1))]
+        return q[2]
+
+
+class LevelStats:
+    """EMG の強さ (ブロックごとの値) の平均・分散と分位点をまとめて追跡する."""
+
+    def __init__(self, quantiles=(0.1, 0.5, 0.9), half_life=None):
+        self.stats = RunningStats(half_life)
+        self.sketches = [P2Quantile(p) for p in quantiles]
+
+    def push(self, x):
+        self.stats.push(x)
+        for sketch in self.sketches:
+            sketch.push(x)
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+    def converged(self, tolerance, z=Z_95):
+        """平均の信頼区間の半幅が平均の tolerance 倍以下かどうか."""
+        return self.stats.ci(z) <= tolerance * abs(self.stats.mean)
+
+    def summary(self):
+        result = {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "std": self.stats.std,
+        }
+        for sketch in self.sketches:
+            if sketch.heights:
+                result[f"p{round(sketch.p * 100)}"] = sketch.value()
+        return result
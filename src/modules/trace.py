@@ -0,0 +1,107 @@
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+
+# 計測する段階 (ブロックが届いてから画面に反映されるまで)
+STAGE_READ = 0  # device.read の呼び出し
+STAGE_RECEIVED = 1  # device.read から戻った
+STAGE_SAMPLED = 2  # 変換・フィルタ処理を終えた
+STAGE_DETECTED = 3  # ゲームスレッドが笑顔を判定した
+STAGE_ACTIVATED = 4  # ハニカムが増減した
+STAGE_DISPLAYED = 5  # pygame.display.update を終えた
+
+STAGES = ["read", "received", "sampled", "detected", "activated", "displayed"]
+
+TRACE_CAPACITY = 4096  # ブロック
+
+PERCENTILES = [50, 95, 99]
+
+
+class Tracer:
+    """ブロックごとに, 処理の各段階の時刻 (time.monotonic) を記録する.
+
+    ブロックの番号 seq を行, 段階を列とする固定長の配列に書き込むので,
+    記録中にメモリを確保しない. 古いブロックの記録は, 新しいブロックを
+    最初に記録したときに (どの段階からでも) 消される.
+    """
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.capacity = capacity
+        self.times = np.full((capacity, len(STAGES)), np.nan)
+        self.seqs = np.full(capacity, -1)
+
+    def mark(self, seq, stage, timestamp=None):
+        """ブロック seq が段階 stage に達した時刻を記録する."""
+        i = seq % self.capacity
+        row = self.times[i]
+        if self.seqs[i] != seq:
+            self.seqs[i] = seq
+            row[:] = np.nan
+        row[stage] = time.monotonic() if timestamp is None else timestamp
+
+    def mark_arrived(self, seqs, times, timestamp=None):
+        """別プロセスで読み出したブロックが届いたことを記録する.
+
+        times (読み出しから戻った時刻) を STAGE_RECEIVED とし, このプロセス
+        で受け取った時刻を STAGE_SAMPLED とする. STAGE_READ は記録しない.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        for seq, received in zip(seqs, times):
+            self.mark(seq, STAGE_RECEIVED, received)
+            self.mark(seq, STAGE_SAMPLED, timestamp)
+
+    def durations(self):
+        """各段階について, 前の段階からの所要時間 (ms) の配列を返す.
+
+        "total" はブロックが届いてから画面に反映されるまでの時間.
+        """
+        durations = {}
+        for stage in range(1, len(STAGES)):
+            d = self.times[:, stage] - self.times[:, stage - 1]
+            durations[STAGES[stage]] = d[~np.isnan(d)] * 1000
+        d = self.times[:, STAGE_DISPLAYED] - self.times[:, STAGE_RECEIVED]
+        durations["total"] = d[~np.isnan(d)] * 1000
+        return durations
+
+    def summary(self):
+        """段階ごとの件数とパーセンタイル (ms) の行を返す."""
+        rows = []
+        for stage, d in self.durations().items():
+            if len(d) > 0:
+                values = np.percentile(d, PERCENTILES).tolist()
+            else:
+                values = [float("nan")] * len(PERCENTILES)
+            rows.append([stage, len(d)] + values)
+        return rows
+
+    def dump(self, filename=None):
+        """集計結果を表示し, filename が与えられれば CSV に保存する."""
+        header = ["stage", "count"] + [f"p{p}_ms" for p in PERCENTILES]
+        rows = self.summary()
+        for row in rows:
+            print("LATENCY:", ", ".join(
+                f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}"
+                for k, v in zip(header, row)), file=sys.stderr)
+        if filename is not None:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerows([header] + rows)
+
+
+class NullTracer:
+    """記録しない Tracer (計測を無効にするときに使う)."""
+
+    def mark(self, seq, stage, timestamp=None):
+        pass
+
+    def mark_arrived(self, seqs, times, timestamp=None):
+        pass
+
+    def dump(self, filename=None):
+        pass
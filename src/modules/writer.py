@@ -0,0 +1,126 @@
+import queue
+import sys
+import threading
+import time
+
+
+# 書き込みの設定
+QUEUE_SIZE = 600  # 件 (100 サンプルのブロックで 60 秒分)
+CHUNK_SIZE = 50  # 件 (まとめて書き込む最大数)
+FLUSH_INTERVAL = 1.0  # s (これ以上は溜めずに書き込む)
+FSYNC_INTERVAL = 10.0  # s
+STOP_TIMEOUT = 10.0  # s (終了時に書き込みの完了を待つ最大時間)
+
+
+class BackgroundWriter:
+    """別スレッドでまとめて書き込むライタ.
+
+    put でデータを上限付きのキューに入れると, 書き込み用スレッドが最大
+    chunk_size 件ずつ (または flush_interval ごとに) リストにまとめて
+    write_func に渡す. flush_func(sync) は fsync_interval ごとと終了時に
+    sync=True で呼ぶ.
+
+    put は待たないので, 呼び出し側のスレッドがディスクの I/O で止まる
+    ことはない. キューが満杯のときはデータを捨て, dropped に数える.
+
+    write_func か flush_func が例外を送出した場合は, 書き込み用スレッドは
+    その例外を error に残して終わる. 以降の put はデータを捨て, stop で
+    その例外を送出する.
+    """
+
+    def __init__(self, write_func, flush_func=None, queue_size=QUEUE_SIZE,
+                 chunk_size=CHUNK_SIZE, flush_interval=FLUSH_INTERVAL,
+                 fsync_interval=FSYNC_INTERVAL):
+        self.write_func = write_func
+        self.flush_func = flush_func
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+
+        self.written = 0
+        self.dropped = 0
+        self.chunks = 0
+        self.max_queued = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, item):
+        """データをキューに入れる. 捨てた場合は False を返す."""
+        if self.error is not None:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.max_queued = max(self.max_queued, self.queue.qsize())
+        return True
+
+    def stop(self):
+        """キューに残ったデータを書き込み, 書き込み用スレッドを終える.
+
+        書き込み中に例外が起きていた場合は, その例外を送出する.
+        """
+        if self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout=STOP_TIMEOUT)
+            except queue.Full:
+                pass
+            self.thread.join(STOP_TIMEOUT)
+            if self.thread.is_alive():
+                print("ERROR: The writer did not finish in time.",
+                      file=sys.stderr)
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        """書き込み用スレッドの関数."""
+        try:
+            self.write_loop()
+        except Exception as e:
+            self.error = e
+            print(f"ERROR: Could not write: {e}", file=sys.stderr)
+
+    def write_loop(self):
+        """run の本体. キューが空になるまで書き込む."""
+        last_sync = time.monotonic()
+        stopping = False
+        while not stopping:
+            items = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.chunk_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                items.append(item)
+
+            if len(items) > 0:
+                self.write_func(items)
+                self.written += len(items)
+                self.chunks += 1
+
+            current_time = time.monotonic()
+            if self.flush_func is not None and (
+                    stopping
+                    or current_time - last_sync >= self.fsync_interval):
+                self.flush_func(True)
+                last_sync = current_time
+
+    def report(self):
+        """書き込みの統計を表示する."""
+        print(f"WRITER: written {self.written}, dropped {self.dropped}, "
+              f"chunks {self.chunks}, max queued {self.max_queued}",
+              file=sys.stderr)
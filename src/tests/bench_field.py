@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pygame
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.honeycomb import (
+    HC_SIZE,
+    HoneycombLayer,
+    compiled_fields,
+    generate_field,
+    load_hc_imgs,
+    make_field_info,
+    make_hc_surface,
+)
+
+
+IMG_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "assets", "img")
+
+RADII = [5, 10, 20, 30, 40]
+N_FRAMES = 20
+
+
+def measure(func, n=1):
+    """func を n 回実行したときの 1 回あたりの時間 (ms) を返す."""
+    start_time = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start_time) / n * 1000
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    pygame.display.set_mode(size=(1, 1))
+    load_hc_imgs(IMG_DIR)
+
+    print("radius,cells,generate_ms,compile_ms,field_info_ms,"
+          "full_render_ms,layer_update_ms")
+    for radius in RADII:
+        field = generate_field(radius)
+        generate_ms = measure(lambda: generate_field(radius))
+        compiled_fields.clear()
+        compile_ms = measure(lambda: make_field_info(field, (0, 0)))
+        field_info_ms = measure(lambda: make_field_info(field, (0, 0)))
+
+        # フィールド全体が収まる大きさの画面
+        field_info = make_field_info(field, (0, 0))
+        pos = np.array(field_info["pos_list"])
+        screen_center = -pos.min(axis=0)
+        screen_size = np.ceil(pos.max(axis=0) - pos.min(axis=0)) + HC_SIZE
+        field_info = make_field_info(field, screen_center)
+
+        full_ms = measure(
+            lambda: make_hc_surface(screen_size, field_info), N_FRAMES)
+        layer = HoneycombLayer(screen_size, field_info)
+        layer.update()
+        layer_ms = measure(layer.update, N_FRAMES)
+
+        print(f"{radius},{field_info['num_of_hcs'] + 1},{generate_ms:.3f},"
+              f"{compile_ms:.3f},{field_info_ms:.3f},{full_ms:.3f},"
+              f"{layer_ms:.3f}")
@@ -0,0 +1,50 @@
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.device import BITS, GAIN, VCC, calc_emg
+from modules.filters import ema
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+RHOS = np.linspace(0.50, 0.999, 50)
+
+
+def calc_ema_loop(arr, rho):
+    """比較用: 1 サンプルずつ計算する EMA (一致の確認は test_filters)."""
+    ems = [arr[0]]
+    for val in arr[1:]:
+        ems.append(rho*ems[-1] + (1 - rho)*val)
+    return np.array(ems)
+
+
+if __name__ == "__main__":
+    files = sorted(glob.glob(os.path.join(DATA_DIR, "*.csv")))
+    signals = [
+        np.abs(calc_emg(np.loadtxt(f, skiprows=1), BITS, VCC, GAIN))
+        for f in files]
+
+    print("file,samples,sweep_ms")
+    total = 0.0
+    for f, emg in zip(files, signals):
+        start_time = time.perf_counter()
+        ema(emg, RHOS)
+        elapsed = time.perf_counter() - start_time
+        total += elapsed
+        print(f"{os.path.basename(f)},{len(emg)},{elapsed*1000:.2f}")
+    print(f"TOTAL: {len(RHOS)} rhos x {len(files)} files in "
+          f"{total*1000:.1f} ms")
+
+    # 1 サンプルずつ計算する方式との比較 (1 ファイル, 1 rho)
+    emg = signals[0]
+    start_time = time.perf_counter()
+    expected = calc_ema_loop(emg, RHOS[0])
+    loop_ms = (time.perf_counter() - start_time) * 1000
+    error = np.abs(ema(emg, RHOS[0]) - expected).max()
+    print(f"LOOP: 1 rho x 1 file in {loop_ms:.1f} ms "
+          f"(max abs error {error:.2e})")
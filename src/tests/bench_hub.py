@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.hub import DeviceHub, Station
+
+
+SAMPLING_RATE = 1000  # Hz
+N_DEVICES = [1, 2, 4, 8, 16]
+DURATION = 5.0  # s (台数ごと)
+
+BITS = 10
+
+
+class FakeDevice:
+    """実時間で乱数のブロックを返す疑似デバイス.
+
+    read が戻った時刻の, 本来ブロックがそろう時刻からの遅れを記録する.
+    """
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.lateness = []
+        self.channels = []
+        self.next_time = 0.0
+
+    def start(self, sampling_rate=SAMPLING_RATE, analog_channels=(0, 1)):
+        self.sampling_rate = sampling_rate
+        self.channels = list(analog_channels)
+        self.next_time = time.perf_counter()
+
+    def read(self, n_samples):
+        self.next_time += n_samples / self.sampling_rate
+        wait = self.next_time - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        self.lateness.append(time.perf_counter() - self.next_time)
+        data = np.zeros((n_samples, 5 + len(self.channels)))
+        data[:, 5:] = self.rng.normal(
+            2**(BITS - 1), 50, (n_samples, len(self.channels)))
+        return data
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    print("devices,blocks_per_s,late_p50_ms,late_p99_ms,late_max_ms,"
+          "align_us")
+    for n in N_DEVICES:
+        devices = [FakeDevice(i) for i in range(n)]
+        for device in devices:
+            device.start()
+        hub = DeviceHub(
+            [Station(f"fake{i}", device) for i, device in enumerate(devices)])
+        hub.start()
+
+        # ゲームのループと同じく, 30 Hz でそろえた値を読み出す
+        align_times = []
+        start_time = time.perf_counter()
+        while time.perf_counter() - start_time < DURATION:
+            if hub.ready():
+                t0 = time.perf_counter()
+                hub.aligned("ema")
+                align_times.append(time.perf_counter() - t0)
+            time.sleep(1 / 30)
+        hub.stop()
+
+        # 最初のブロックは起動の遅れを含むので除く
+        lateness = np.concatenate([d.lateness[1:] for d in devices]) * 1000
+        blocks = sum(station.pipe.count for station in hub.stations)
+        p50, p99 = np.percentile(lateness, [50, 99])
+        print(f"{n},{blocks / DURATION:.0f},{p50:.2f},{p99:.2f},"
+              f"{lateness.max():.2f},{np.median(align_times) * 1e6:.0f}")
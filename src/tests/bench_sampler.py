@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.buffer import RingBuffer
+from modules.device import (
+    MAX_BLOCK_DATA_LEN,
+    N_SAMPLES,
+    SAMPLING_RATE,
+    get_device,
+    sample_block,
+    start_device,
+)
+from modules.pipeline import PIPE_FIELDS, SamplePipe
+from modules.sampler import SamplerProcess
+from modules.spectral import SpectralDetector
+
+
+ADDRESS = "replay:*_v1_smile.csv@1"
+DURATION = 10.0  # s (モードごと)
+
+# 描画の負荷 (GIL を持ったまま Python のコードを動かす時間)
+FPS = 30
+RENDER_LOAD = 0.025  # s (1 フレームあたり)
+
+WARMUP_BLOCKS = 10  # 起動直後の遅れを含むので除く
+
+BLOCK_INTERVAL = N_SAMPLES / SAMPLING_RATE  # s
+PIPE_CAPACITY = int(DURATION / BLOCK_INTERVAL) + 50  # 全ブロックが残る
+
+
+def render(duration):
+    """描画の代わりに, duration 秒だけ Python のループを回す."""
+    end_time = time.perf_counter() + duration
+    x = 0
+    while time.perf_counter() < end_time:
+        for i in range(1000):
+            x += i * i
+    return x
+
+
+def game_loop(pipe, stop_event):
+    """30 fps で描画の負荷をかけながら, DURATION 秒待つ."""
+    while pipe.count == 0 and not stop_event.is_set():
+        time.sleep(0.01)
+    start_time = time.perf_counter()
+    next_time = start_time
+    while time.perf_counter() - start_time < DURATION:
+        render(RENDER_LOAD)
+        next_time += 1 / FPS
+        time.sleep(max(next_time - time.perf_counter(), 0.0))
+
+
+def run_thread():
+    """app3 と同じく, サンプリングをスレッドで行う."""
+    device = get_device(ADDRESS)
+    start_device(device)
+    accs = RingBuffer(MAX_BLOCK_DATA_LEN)
+    emgs = RingBuffer(MAX_BLOCK_DATA_LEN)
+    emgs_ema = RingBuffer(MAX_BLOCK_DATA_LEN)
+    pipe = SamplePipe(PIPE_CAPACITY, PIPE_FIELDS)
+    stop_event = threading.Event()
+
+    def sample_t_func():
+        features = {}
+        detector = SpectralDetector()
+        while not stop_event.is_set():
+            sample_block(device, accs, emgs, emgs_ema, features, detector)
+            pipe.publish(features)
+
+    sample_t = threading.Thread(target=sample_t_func)
+    sample_t.start()
+    game_loop(pipe, stop_event)
+    stop_event.set()
+    sample_t.join()
+    return pipe.times[:pipe.count].copy()
+
+
+def run_process():
+    """SamplerProcess で, サンプリングを別プロセスで行う."""
+    sampler = SamplerProcess(
+        ADDRESS, MAX_BLOCK_DATA_LEN, PIPE_CAPACITY, PIPE_FIELDS)
+    sampler.start()
+    game_loop(sampler.pipe, sampler.stop_event)
+    sampler.stop_event.set()
+    sampler.process.join()
+    times = sampler.pipe.times[:sampler.pipe.count].copy()
+    sampler.stop()
+    return times
+
+
+if __name__ == "__main__":
+    print("mode,blocks,interval_std_ms,jitter_p50_ms,jitter_p99_ms,"
+          "jitter_max_ms")
+    for mode, func in [("thread", run_thread), ("process", run_process)]:
+        intervals = np.diff(func()[WARMUP_BLOCKS:])
+        jitter = np.abs(intervals - BLOCK_INTERVAL) * 1000
+        p50, p99 = np.percentile(jitter, [50, 99])
+        print(f"{mode},{len(intervals)},{intervals.std() * 1000:.2f},"
+              f"{p50:.2f},{p99:.2f},{jitter.max():.2f}")
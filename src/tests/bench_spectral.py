@@ -0,0 +1,94 @@
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.device import (
+    BITS,
+    DATA_DIR,
+    EMGS_EMA_RHO_BLOCK,
+    GAIN,
+    N_SAMPLES,
+    VCC,
+    calc_emg,
+)
+from modules.facial import SMILE_THD
+from modules.filters import ema
+from modules.recording import parse_filename, read_signal
+from modules.spectral import SpectralDetector, is_smile, power_threshold
+
+
+BUDGET = 1.0  # ms (1 ブロックあたり)
+
+# ラベルごとの正解 (笑顔かどうか). 表情が途中で変わる記録は正解なし.
+# (正解率の確認は test_spectral で行う. ここでは閾値の判定と比べる)
+EXPECTED = {
+    "flat": False,
+    "smile": True,
+    "neck-ver": False,
+    "neck-hor": False,
+    "eyeb": False,
+}
+
+
+def replay(emg):
+    """ブロックごとに両方の判定を行い, 判定結果と処理時間 (ms) を返す."""
+    detector = SpectralDetector()
+    power_thd = power_threshold(SMILE_THD)
+    state = None
+    thd_results = []
+    spec_results = []
+    elapsed = []
+    for start in range(0, len(emg) - N_SAMPLES + 1, N_SAMPLES):
+        block = emg[start:start + N_SAMPLES]
+        state = ema(np.abs(block), EMGS_EMA_RHO_BLOCK, state)[-1]
+        thd_results.append(state > SMILE_THD)
+
+        start_time = time.perf_counter()
+        power, ratio = detector.update(block)
+        spec_results.append(is_smile(power, ratio, power_thd))
+        elapsed.append((time.perf_counter() - start_time) * 1000)
+    return np.array(thd_results), np.array(spec_results), np.array(elapsed)
+
+
+if __name__ == "__main__":
+    files = sorted(glob.glob(os.path.join(DATA_DIR, "*.csv")))
+
+    print("file,label,blocks,threshold_rate,spectral_rate,"
+          "threshold_acc,spectral_acc")
+    scores = {}
+    all_elapsed = []
+    for f in files:
+        _, mode = parse_filename(f)
+        _, data = read_signal(f)
+        thd, spec, elapsed = replay(calc_emg(data, BITS, VCC, GAIN))
+        all_elapsed.append(elapsed)
+
+        expected = EXPECTED.get(mode)
+        if expected is None:
+            thd_acc = spec_acc = ""
+        else:
+            thd_acc = f"{np.mean(thd == expected):.3f}"
+            spec_acc = f"{np.mean(spec == expected):.3f}"
+            scores.setdefault(mode, []).append(
+                (np.mean(thd == expected), np.mean(spec == expected)))
+        print(f"{os.path.basename(f)},{mode},{len(thd)},{thd.mean():.3f},"
+              f"{spec.mean():.3f},{thd_acc},{spec_acc}")
+
+    print()
+    print("label,files,threshold_acc,spectral_acc")
+    for mode, values in scores.items():
+        thd_acc, spec_acc = np.mean(values, axis=0)
+        print(f"{mode},{len(values)},{thd_acc:.3f},{spec_acc:.3f}")
+
+    elapsed = np.concatenate(all_elapsed)
+    p50, p99 = np.percentile(elapsed, [50, 99])
+    print()
+    print(f"SPECTRAL: {len(elapsed)} blocks, p50 {p50*1000:.0f} us, "
+          f"p99 {p99*1000:.0f} us, max {elapsed.max()*1000:.0f} us "
+          f"(budget {BUDGET*1000:.0f} us)")
+    if p99 > BUDGET:
+        print("WARNING: Over budget.", file=sys.stderr)
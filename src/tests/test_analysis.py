@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.analysis import analyze_file, emg_column
+from modules.device import EMG_PIN
+from modules.recording import RECORDING_EXT, RecordingWriter, make_header
+
+
+N_SAMPLES = 1000
+
+
+def write_recording(directory, pins, data):
+    filename = os.path.join(
+        directory, f"2025-01-01_00-00-00_v1_test{RECORDING_EXT}")
+    header = make_header("test", [f"A{pin}" for pin in pins], pins)
+    with RecordingWriter(filename, header) as writer:
+        writer.append(data)
+    return filename
+
+
+def test_emg_column():
+    assert emg_column({"pins": [0, EMG_PIN]}) == 1
+    assert emg_column({"pins": [EMG_PIN, EMG_PIN + 2]}) == 0
+    assert emg_column({"pins": [None]}) == 0
+
+
+def test_emg_not_recorded():
+    try:
+        emg_column({"pins": [0]})
+    except ValueError:
+        return
+    assert False, "ValueError was not raised"
+
+
+def test_analyze_uses_emg_pin():
+    """EMG が最後の列でなくても, EMG の列を解析する."""
+    rng = np.random.default_rng(0)
+    emg = rng.integers(0, 1024, N_SAMPLES)
+    flat = np.full(N_SAMPLES, 512)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = write_recording(
+            directory, [EMG_PIN, EMG_PIN + 2], np.column_stack([emg, flat]))
+        [features] = analyze_file(filename, "data")
+    assert features["samples"] == N_SAMPLES
+    assert features["mean_abs"] > 0.1
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"{name}: OK")
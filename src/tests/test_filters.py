@@ -0,0 +1,138 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.filters import (
+    ema,
+    lowpass_envelope,
+    moving_average,
+    rho_for_cutoff,
+    rms_envelope,
+)
+
+
+RHOS = [0.0, 0.5, 0.8, 0.9, 0.995, 0.80 ** (1/100)]
+N_SAMPLES = 100
+WINDOWS = [1, 2, 50, 6000]  # サンプル (信号より長い窓も含む)
+
+SAMPLING_RATE = 1000  # Hz
+CUTOFFS = [2.0, 10.0]  # Hz
+
+TOLERANCE = 1e-12
+
+
+def ema_loop(x, rho, init=None):
+    """比較用: 漸化式を 1 サンプルずつ計算する EMA."""
+    y = np.empty(len(x))
+    prev = x[0] if init is None else init
+    for i, value in enumerate(x):
+        prev = rho*prev + (1 - rho)*value
+        y[i] = prev
+    return y
+
+
+def window_loop(x, n, func):
+    """比較用: 直近 n サンプル (先頭では揃っている分) に func を適用する."""
+    return np.array([func(x[max(0, i - n + 1):i + 1]) for i in range(len(x))])
+
+
+def make_signal(n=5000, seed=0):
+    """整流した EMG に似た, 正の乱数の信号."""
+    rng = np.random.default_rng(seed)
+    return np.abs(rng.normal(0.0, 0.1, n))
+
+
+def test_ema_matches_loop():
+    x = make_signal()
+    for rho in RHOS:
+        np.testing.assert_allclose(
+            ema(x, rho), ema_loop(x, rho), rtol=0, atol=TOLERANCE)
+
+
+def test_ema_multi_rho():
+    x = make_signal()
+    y = ema(x, RHOS)
+    assert y.shape == (len(RHOS), len(x))
+    for row, rho in zip(y, RHOS):
+        np.testing.assert_allclose(
+            row, ema_loop(x, rho), rtol=0, atol=TOLERANCE)
+
+
+def test_ema_init():
+    x = make_signal()
+    inits = np.linspace(0.0, 1.0, len(RHOS))
+    y = ema(x, RHOS, init=inits)
+    for row, rho, init in zip(y, RHOS, inits):
+        np.testing.assert_allclose(
+            row, ema_loop(x, rho, init), rtol=0, atol=TOLERANCE)
+
+    # スカラーの init は全 rho に使う
+    np.testing.assert_allclose(
+        ema(x, RHOS, init=0.5)[2], ema_loop(x, RHOS[2], 0.5),
+        rtol=0, atol=TOLERANCE)
+
+
+def test_ema_block_continuation():
+    """sample_block と同じく, ブロックごとに前の値を引き継いで計算する."""
+    x = make_signal()
+    expected = ema(x, RHOS)
+    prev = None
+    for start in range(0, len(x), N_SAMPLES):
+        block = ema(x[start:start + N_SAMPLES], RHOS, init=prev)
+        np.testing.assert_allclose(
+            block, expected[:, start:start + N_SAMPLES],
+            rtol=0, atol=TOLERANCE)
+        prev = block[:, -1]
+
+
+def test_ema_empty():
+    assert ema(np.zeros(0), [0.5, 0.6]).shape == (2, 0)
+    assert ema(np.zeros(0), [0.5, 0.6], init=[0.1, 0.2]).shape == (2, 0)
+    assert ema(np.zeros(0), 0.5).shape == (0,)
+
+
+def test_moving_average():
+    x = make_signal()
+    for n in WINDOWS:
+        np.testing.assert_allclose(
+            moving_average(x, n), window_loop(x, n, np.mean),
+            rtol=0, atol=TOLERANCE)
+
+
+def test_rms_envelope():
+    x = make_signal() - 0.05
+    for n in WINDOWS:
+        expected = window_loop(x, n, lambda w: np.sqrt(np.mean(w**2)))
+        np.testing.assert_allclose(
+            rms_envelope(x, n), expected, rtol=0, atol=1e-9)
+
+
+def test_lowpass_envelope():
+    """EMA を order 段重ねたもの (入力は整流する) と一致する."""
+    x = make_signal() - 0.05
+    for cutoff in CUTOFFS:
+        rho = rho_for_cutoff(cutoff, SAMPLING_RATE)
+        for order in [1, 2, 3]:
+            expected = np.abs(x)
+            for _ in range(order):
+                expected = ema_loop(expected, rho)
+            np.testing.assert_allclose(
+                lowpass_envelope(x, cutoff, SAMPLING_RATE, order), expected,
+                rtol=0, atol=TOLERANCE)
+
+
+def test_rho_for_cutoff():
+    """1 段の EMA の時定数が, 遮断周波数の 1/(2 pi) 倍になる."""
+    for cutoff in CUTOFFS:
+        rho = rho_for_cutoff(cutoff, SAMPLING_RATE)
+        tau = -1 / (SAMPLING_RATE * np.log(rho))
+        assert abs(tau - 1 / (2*np.pi*cutoff)) < 1e-12
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"{name}: OK")
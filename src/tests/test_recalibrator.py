@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.facial import (
+    RECAL_MARGIN,
+    RECAL_MIN_BLOCKS,
+    RECAL_MIN_SMILING,
+    THD_RATE,
+    Recalibrator,
+)
+
+
+def run(criteria, levels):
+    recalibrator = Recalibrator(criteria=criteria)
+    for level in levels:
+        recalibrator.update(level, False)
+    return recalibrator
+
+
+def test_follows_baseline_drift():
+    criteria = {"baseline_ave": 0.02, "smiling_ave": 0.12}
+    run(criteria, [0.03] * 200)
+    assert abs(criteria["smiling_ave"] - 0.13) < 1e-9
+
+
+def test_stays_positive():
+    """基準より大きく下がっても, 0 以下にはならない."""
+    criteria = {"baseline_ave": 0.2, "smiling_ave": 0.12}
+    run(criteria, [0.0] * 200)
+    assert criteria["smiling_ave"] >= RECAL_MIN_SMILING
+
+
+def test_stays_above_baseline():
+    """閾値が追跡中のベースラインを下回らない."""
+    criteria = {"smiling_ave": 0.05}
+    recalibrator = run(
+        criteria, [0.01] * RECAL_MIN_BLOCKS + [0.06] * 2000)
+    threshold = criteria["smiling_ave"] * THD_RATE
+    assert threshold >= recalibrator.stats.mean * RECAL_MARGIN - 1e-12
+    assert threshold > 0.06
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"{name}: OK")
@@ -0,0 +1,105 @@
+import glob
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.device import (
+    BITS,
+    DATA_DIR,
+    GAIN,
+    N_SAMPLES,
+    SAMPLING_RATE,
+    VCC,
+    calc_emg,
+)
+from modules.facial import SMILE_THD
+from modules.recording import parse_filename, read_signal
+from modules.spectral import (
+    EMG_BAND,
+    N_SEGMENTS,
+    SEGMENT_HOP,
+    SpectralDetector,
+    is_smile,
+    power_threshold,
+)
+
+
+DURATION = 5.0  # s (合成信号の長さ)
+
+# 最初の Welch の平均が揃うまでのブロック数 (判定から除く)
+WARMUP_BLOCKS = -(-N_SEGMENTS * SEGMENT_HOP // N_SAMPLES) + 1
+
+# 記録データでの正解 (笑顔かどうか) と, 求める正解率
+EXPECTED = {
+    "smile": True,
+    "flat": False,
+    "neck-ver": False,
+    "neck-hor": False,
+    "eyeb": False,
+}
+MIN_ACCURACY = 0.9
+
+
+def band_noise(std, band, seed=0):
+    """band (Hz) の帯域だけに成分を持つ, 標準偏差 std (mV) のノイズ."""
+    n = int(DURATION * SAMPLING_RATE)
+    rng = np.random.default_rng(seed)
+    spectrum = np.fft.rfft(rng.normal(size=n))
+    freqs = np.fft.rfftfreq(n, 1 / SAMPLING_RATE)
+    spectrum[(freqs < band[0]) | (freqs >= band[1])] = 0
+    x = np.fft.irfft(spectrum, n)
+    return x * std / x.std()
+
+
+def decisions(emg):
+    """ブロックごとの判定結果 (準備中のブロックを除く)."""
+    detector = SpectralDetector()
+    power_thd = power_threshold(SMILE_THD)
+    results = []
+    for start in range(0, len(emg) - N_SAMPLES + 1, N_SAMPLES):
+        power, ratio = detector.update(emg[start:start + N_SAMPLES])
+        results.append(is_smile(power, ratio, power_thd))
+    return np.array(results[WARMUP_BLOCKS:])
+
+
+def test_band_noise_above_threshold_is_smile():
+    emg = band_noise(2 * SMILE_THD, (40, 200))
+    assert decisions(emg).all()
+
+
+def test_band_noise_below_threshold_is_not_smile():
+    emg = band_noise(0.3 * SMILE_THD, (40, 200))
+    assert not decisions(emg).any()
+
+
+def test_low_frequency_artifact_is_not_smile():
+    """首や眉の動きに相当する大きな低周波の揺れがある場合は, EMG の帯域
+    のパワーが閾値を超えていても笑顔と判定しない."""
+    emg = band_noise(1.5 * SMILE_THD, (40, 200))
+    emg += band_noise(10 * SMILE_THD, (1, EMG_BAND[0] - 5), seed=1)
+    assert not decisions(emg).any()
+
+
+def test_recordings():
+    """ラベル付きの記録データで, ラベルごとの正解率を確かめる."""
+    scores = {}
+    for filename in sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))):
+        _, mode = parse_filename(filename)
+        if mode not in EXPECTED:
+            continue
+        _, data = read_signal(filename)
+        results = decisions(calc_emg(data, BITS, VCC, GAIN))
+        scores.setdefault(mode, []).append(
+            np.mean(results == EXPECTED[mode]))
+    assert set(scores) == set(EXPECTED)
+    for mode, values in scores.items():
+        assert np.mean(values) >= MIN_ACCURACY, (mode, values)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"{name}: OK")
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from modules.pipeline import PIPE_CAPACITY, PIPE_FIELDS, SamplePipe
+from modules.trace import (
+    STAGE_ACTIVATED,
+    STAGE_DETECTED,
+    STAGE_DISPLAYED,
+    STAGE_READ,
+    STAGE_RECEIVED,
+    STAGE_SAMPLED,
+    Tracer,
+)
+
+
+CAPACITY = 8  # ブロック (行の再利用を確かめるため小さくする)
+N_BLOCKS = 3 * CAPACITY
+BLOCK_TIME = 0.1  # s
+
+
+def test_thread_mode():
+    tracer = Tracer(CAPACITY)
+    for seq in range(N_BLOCKS):
+        t = seq * BLOCK_TIME
+        tracer.mark(seq, STAGE_READ, t)
+        tracer.mark(seq, STAGE_RECEIVED, t + 0.001)
+        tracer.mark(seq, STAGE_SAMPLED, t + 0.002)
+        tracer.mark(seq, STAGE_DETECTED, t + 0.010)
+        tracer.mark(seq, STAGE_ACTIVATED, t + 0.011)
+        tracer.mark(seq, STAGE_DISPLAYED, t + 0.020)
+    durations = tracer.durations()
+    assert len(durations["total"]) == CAPACITY
+    np.testing.assert_allclose(durations["total"], 19.0)
+
+
+def test_process_mode():
+    """STAGE_READ を記録しないプロセス版でも, 遅延が有限の値になる."""
+    tracer = Tracer(CAPACITY)
+    pipe = SamplePipe(PIPE_CAPACITY, PIPE_FIELDS)
+    reader = pipe.reader()
+    for seq in range(N_BLOCKS):
+        t = seq * BLOCK_TIME
+        pipe.publish({field: 0.0 for field in PIPE_FIELDS}, timestamp=t)
+        values, times = reader.read()
+        tracer.mark_arrived(
+            range(reader.next - len(values), reader.next), times,
+            timestamp=t + 0.002)
+        tracer.mark(reader.next - 1, STAGE_DETECTED, t + 0.010)
+        tracer.mark(reader.next - 1, STAGE_ACTIVATED, t + 0.011)
+        tracer.mark(reader.next - 1, STAGE_DISPLAYED, t + 0.020)
+    durations = tracer.durations()
+    for stage in ["sampled", "detected", "activated", "displayed", "total"]:
+        assert len(durations[stage]) == CAPACITY, stage
+        assert np.isfinite(durations[stage]).all(), stage
+    np.testing.assert_allclose(durations["total"], 20.0)
+    assert len(durations["received"]) == 0
+
+
+def test_reused_row_is_cleared():
+    """行を再利用したとき, 前のブロックの段階が残らない."""
+    tracer = Tracer(CAPACITY)
+    tracer.mark(0, STAGE_READ, 0.0)
+    tracer.mark(0, STAGE_DISPLAYED, 1.0)
+    tracer.mark(CAPACITY, STAGE_RECEIVED, 2.0)
+    assert len(tracer.durations()["total"]) == 0
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_"):
+            func()
+            print(f"{name}: OK")